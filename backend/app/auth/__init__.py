@@ -10,7 +10,13 @@ from app.auth.security import (
     create_access_token,
     decode_token,
     get_current_user,
+    get_current_user_claims,
+    get_current_user_cached,
     authenticate_user,
+    authenticate_user_async,
+    invalidate_user_cache,
+    user_claims,
+    UserClaims,
 )
 from app.auth.router import router
 
@@ -20,6 +26,12 @@ __all__ = [
     "create_access_token",
     "decode_token",
     "get_current_user",
+    "get_current_user_claims",
+    "get_current_user_cached",
     "authenticate_user",
+    "authenticate_user_async",
+    "invalidate_user_cache",
+    "user_claims",
+    "UserClaims",
     "router",
 ]
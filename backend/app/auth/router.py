@@ -2,10 +2,12 @@
 Authentication router for HelseJournal.
 """
 
+import asyncio
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from typing import Optional
 
@@ -13,18 +15,27 @@ from app.config import settings
 from app.database.connection import get_db
 from app.database.models import User
 from app.auth.security import (
-    authenticate_user,
+    authenticate_user_async,
     create_access_token,
     get_current_user,
+    get_current_user_claims,
+    get_current_user_cached,
     get_password_hash,
     verify_password,
-    create_default_user,
+    clear_verify_cache,
+    invalidate_user_cache,
+    user_claims,
+    CachedUser,
+    UserClaims,
 )
 
 router = APIRouter()
 
 
-# Pydantic models for request/response
+# Pydantic models for request/response.
+# Routes that return server-built data use model_construct() with
+# response_model=None, so FastAPI does not validate the payload a second time;
+# the model is still advertised in the OpenAPI schema via `responses`.
 class Token(BaseModel):
     """Token response model."""
     access_token: str
@@ -65,7 +76,7 @@ class LoginRequest(BaseModel):
     password: str
 
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=None, responses={200: {"model": Token}})
 async def login(
     login_data: LoginRequest,
     db: Session = Depends(get_db)
@@ -80,10 +91,7 @@ async def login(
     Returns:
         Token: JWT access token
     """
-    # Ensure default user exists
-    create_default_user(db)
-    
-    user = authenticate_user(db, login_data.username, login_data.password)
+    user = await authenticate_user_async(db, login_data.username, login_data.password)
     
     if not user:
         raise HTTPException(
@@ -94,18 +102,18 @@ async def login(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username},
+        data=user_claims(user),
         expires_delta=access_token_expires
     )
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
-    }
+    return Token.model_construct(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
 
 
-@router.post("/token", response_model=Token)
+@router.post("/token", response_model=None, responses={200: {"model": Token}})
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -120,10 +128,7 @@ async def login_for_access_token(
     Returns:
         Token: JWT access token
     """
-    # Ensure default user exists
-    create_default_user(db)
-    
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     
     if not user:
         raise HTTPException(
@@ -134,19 +139,19 @@ async def login_for_access_token(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username},
+        data=user_claims(user),
         expires_delta=access_token_expires
     )
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
-    }
+    return Token.model_construct(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
 
 
-@router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+@router.get("/me", response_model=None, responses={200: {"model": UserResponse}})
+async def get_me(current_user: CachedUser = Depends(get_current_user_cached)):
     """
     Get current user information.
     
@@ -156,7 +161,14 @@ async def get_me(current_user: User = Depends(get_current_user)):
     Returns:
         UserResponse: User information
     """
-    return current_user
+    return UserResponse.model_construct(
+        id=current_user.id,
+        username=current_user.username,
+        email=current_user.email,
+        full_name=current_user.full_name,
+        language=current_user.language,
+        theme=current_user.theme
+    )
 
 
 @router.put("/me", response_model=UserResponse)
@@ -176,19 +188,33 @@ async def update_me(
     Returns:
         UserResponse: Updated user information
     """
-    if user_update.email is not None:
-        current_user.email = user_update.email
-    if user_update.full_name is not None:
-        current_user.full_name = user_update.full_name
-    if user_update.language is not None:
-        current_user.language = user_update.language
-    if user_update.theme is not None:
-        current_user.theme = user_update.theme
+    changed = {
+        field: value
+        for field, value in user_update.model_dump(exclude_unset=True).items()
+        if value is not None
+    }
+    if not changed:
+        return current_user
     
+    # Write and read back in one round trip instead of UPDATE + refresh SELECT
+    stmt = (
+        update(User)
+        .where(User.id == current_user.id)
+        .values(**changed)
+        .returning(
+            User.id,
+            User.username,
+            User.email,
+            User.full_name,
+            User.language,
+            User.theme
+        )
+    )
+    updated = db.execute(stmt).one()
     db.commit()
-    db.refresh(current_user)
+    invalidate_user_cache(current_user.username)
     
-    return current_user
+    return updated
 
 
 @router.post("/change-password")
@@ -208,20 +234,27 @@ async def change_password(
     Returns:
         dict: Success message
     """
-    if not verify_password(password_change.current_password, current_user.hashed_password):
+    # bcrypt is CPU-bound; run it in a worker thread to keep the event loop free
+    if not await asyncio.to_thread(
+        verify_password, password_change.current_password, current_user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
-    current_user.hashed_password = get_password_hash(password_change.new_password)
+    current_user.hashed_password = await asyncio.to_thread(
+        get_password_hash, password_change.new_password
+    )
     db.commit()
+    invalidate_user_cache(current_user.username)
+    clear_verify_cache()
     
     return {"message": "Password changed successfully"}
 
 
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
+async def logout(current_user: UserClaims = Depends(get_current_user_claims)):
     """
     Logout endpoint (client-side token removal).
     
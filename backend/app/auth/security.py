@@ -2,29 +2,128 @@
 Security utilities for authentication.
 """
 
-from datetime import datetime, timedelta
-from typing import Optional, Union
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import NamedTuple, Optional, Tuple, Union
+import bcrypt
+import jwt
+import orjson
+from cachetools import LRUCache, TTLCache
+from fastapi import Depends, Header, HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import bindparam, select, text
 from sqlalchemy.orm import Session
 
 from app.config import settings
 from app.database.connection import get_db
 from app.database.models import User
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# HTTP Bearer for token authentication
-security = HTTPBearer()
+class UserClaims(BaseModel):
+    """Identity of the current user, as signed into the access token."""
+    id: int
+    username: str
+    language: Optional[str] = None
+    theme: Optional[str] = None
+
+
+class CachedUser(NamedTuple):
+    """Detached snapshot of a user row, safe to share between requests."""
+    id: int
+    username: str
+    hashed_password: str
+    email: Optional[str]
+    full_name: Optional[str]
+    language: str
+    theme: str
+    is_active: bool
+
+
+# User-by-username statement, built once so SQLAlchemy's compiled cache is reused
+_USER_BY_USERNAME = select(User).where(User.username == bindparam("u"))
+
+# Core variant for read-only lookups; returns a plain Row, bypassing the ORM
+_SELECT_USER = text(
+    "SELECT id, username, hashed_password, email, full_name, language, theme, is_active "
+    "FROM users WHERE username = :u"
+)
+
+# Recently read users, keyed by username
+_user_cache: "TTLCache[str, CachedUser]" = TTLCache(maxsize=1024, ttl=30)
+_user_cache_lock = threading.Lock()
+
+# Verified token payloads, keyed by SHA-256 of the token string
+_token_cache: "LRUCache[bytes, dict]" = LRUCache(maxsize=2048)
+_token_cache_lock = threading.Lock()
+
+# Successful bcrypt verifications, keyed by (HMAC of the password, stored hash).
+# The plaintext itself is never kept; failed attempts are not cached so
+# guessing still pays the full bcrypt cost.
+_VERIFY_CACHE_SIZE = 4096
+_verify_cache: "OrderedDict[Tuple[bytes, str], bool]" = OrderedDict()
+_verify_cache_lock = threading.Lock()
+
+
+def _password_digest(plain_password: str) -> bytes:
+    """Keyed digest of a password, used as the verification cache key."""
+    return hmac.new(
+        settings.JWT_SECRET_KEY.encode("utf-8"),
+        plain_password.encode("utf-8"),
+        hashlib.sha256
+    ).digest()
+
+
+def _get_user_cached(db: Session, username: str) -> Optional[CachedUser]:
+    """
+    Look up a user by username, serving repeat lookups from a short-lived cache.
+    
+    Args:
+        db: Database session
+        username: The username
+        
+    Returns:
+        Optional[CachedUser]: The user snapshot, or None if no such user
+    """
+    with _user_cache_lock:
+        cached = _user_cache.get(username)
+    if cached is not None:
+        return cached
+    
+    row = db.execute(_SELECT_USER, {"u": username}).first()
+    if row is None:
+        return None
+    
+    cached = CachedUser(*row)
+    with _user_cache_lock:
+        _user_cache[username] = cached
+    
+    return cached
+
+
+def invalidate_user_cache(username: str) -> None:
+    """Drop a user from the lookup cache after the row has changed."""
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
+
+
+def clear_verify_cache() -> None:
+    """Forget all cached password verifications."""
+    with _verify_cache_lock:
+        _verify_cache.clear()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a plain password against a hashed password.
     
+    Successful verifications are cached so repeated logins skip bcrypt.
+    
     Args:
         plain_password: The plain text password
         hashed_password: The hashed password
@@ -32,7 +131,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True if passwords match
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    key = (_password_digest(plain_password), hashed_password)
+    
+    with _verify_cache_lock:
+        if key in _verify_cache:
+            _verify_cache.move_to_end(key)
+            return True
+    
+    if not bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8")):
+        return False
+    
+    with _verify_cache_lock:
+        _verify_cache[key] = True
+        if len(_verify_cache) > _VERIFY_CACHE_SIZE:
+            _verify_cache.popitem(last=False)
+    
+    return True
 
 
 def get_password_hash(password: str) -> str:
@@ -45,7 +159,30 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: The hashed password
     """
-    return pwd_context.hash(password)
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+
+def _b64url(data: bytes) -> bytes:
+    """Base64url-encode without padding, as JWS requires."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# JOSE header for HS256 tokens; constant, so encoded once
+_HS256_HEADER = _b64url(orjson.dumps({"alg": "HS256", "typ": "JWT"}))
+
+
+def _encode_hs256(claims: dict, key: str) -> str:
+    """
+    Sign claims as an HS256 JWT with hmac/hashlib (OpenSSL, SHA-NI where available).
+    
+    Produces the same compact serialization as jwt.encode, without PyJWT's
+    per-call header building and algorithm dispatch.
+    """
+    payload = _b64url(orjson.dumps(claims))
+    signing_input = _HS256_HEADER + b"." + payload
+    signature = hmac.new(key.encode("utf-8"), signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode("ascii")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -61,13 +198,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     """
     to_encode = data.copy()
     
+    # "exp" is a POSIX timestamp, so plain integer arithmetic is enough
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        lifetime = int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        lifetime = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    to_encode["exp"] = int(time.time()) + lifetime
+    
+    if settings.JWT_ALGORITHM == "HS256":
+        encoded_jwt = _encode_hs256(to_encode, settings.JWT_SECRET_KEY)
+    else:
+        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     
     return encoded_jwt
 
@@ -76,43 +218,147 @@ def decode_token(token: str) -> Optional[dict]:
     """
     Decode and validate a JWT token.
     
+    Tokens that have already been verified are served from a cache and only
+    have their expiry re-checked.
+    
     Args:
         token: The JWT token to decode
         
     Returns:
         Optional[dict]: The decoded token payload or None if invalid
     """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    
+    with _token_cache_lock:
+        payload = _token_cache.get(key)
+    if payload is not None:
+        if payload["exp"] > time.time():
+            return payload
+        with _token_cache_lock:
+            _token_cache.pop(key, None)
+        return None
+    
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        return payload
-    except JWTError:
+    except jwt.PyJWTError:
         return None
+    
+    if "exp" in payload:
+        with _token_cache_lock:
+            _token_cache[key] = payload
+    
+    return payload
+
+
+def _credentials_exception() -> HTTPException:
+    """Build the 401 raised when a token cannot be validated."""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def _bearer_token(authorization: Optional[str] = Header(None)) -> str:
+    """
+    Extract the raw token from an ``Authorization: Bearer <token>`` header.
+    
+    Args:
+        authorization: The Authorization header value
+        
+    Returns:
+        str: The bearer token
+        
+    Raises:
+        HTTPException: If the header is missing or not a bearer token
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    token = token.strip()
+    if scheme.lower() != "bearer" or not token:
+        raise _credentials_exception()
+    return token
+
+
+def user_claims(user: Union[User, CachedUser]) -> dict:
+    """
+    Build the access token claims for a user.
+    
+    Args:
+        user: The user the token is issued to
+        
+    Returns:
+        dict: Claims to pass to create_access_token
+    """
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "lang": user.language,
+        "theme": user.theme,
+        "active": user.is_active,
+    }
+
+
+async def get_current_user_claims(
+    token: str = Depends(_bearer_token)
+) -> UserClaims:
+    """
+    Get the current user from the token claims alone, without a database query.
+    
+    Use this for endpoints that only need the user's identity. Language,
+    theme and the active flag reflect the values at login time.
+    
+    Args:
+        token: The bearer token from the Authorization header
+        
+    Returns:
+        UserClaims: The authenticated user's claims
+        
+    Raises:
+        HTTPException: If authentication fails
+    """
+    payload = decode_token(token)
+    if payload is None:
+        raise _credentials_exception()
+    
+    username = payload.get("sub")
+    user_id = payload.get("uid")
+    if username is None or user_id is None:
+        raise _credentials_exception()
+    
+    # Deactivation takes effect when the user's current token expires
+    if payload.get("active") is False:
+        raise _credentials_exception()
+    
+    return UserClaims(
+        id=user_id,
+        username=username,
+        language=payload.get("lang"),
+        theme=payload.get("theme"),
+    )
 
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    token: str = Depends(_bearer_token),
     db: Session = Depends(get_db)
 ) -> User:
     """
-    Get the current authenticated user from the token.
+    Get the current authenticated user from the token, loaded from the database.
+    
+    Use this for endpoints that read fields not in the token or modify the user.
     
     Args:
-        credentials: The HTTP authorization credentials
+        token: The bearer token from the Authorization header
         db: Database session
         
     Returns:
         User: The authenticated user
         
     Raises:
-        HTTPException: If authentication fails
+        HTTPException: If authentication fails or the account is inactive
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    credentials_exception = _credentials_exception()
     
-    payload = decode_token(credentials.credentials)
+    payload = decode_token(token)
     if payload is None:
         raise credentials_exception
     
@@ -120,14 +366,49 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    user = db.execute(_USER_BY_USERNAME, {"u": username}).scalar_one_or_none()
+    if user is None or not user.is_active:
         raise credentials_exception
     
     return user
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def get_current_user_cached(
+    token: str = Depends(_bearer_token),
+    db: Session = Depends(get_db)
+) -> CachedUser:
+    """
+    Get the current authenticated user for read-only use.
+    
+    Served from the user cache, so the data may be up to a few seconds old
+    unless the user was changed through this process.
+    
+    Args:
+        token: The bearer token from the Authorization header
+        db: Database session
+        
+    Returns:
+        CachedUser: The authenticated user
+        
+    Raises:
+        HTTPException: If authentication fails or the account is inactive
+    """
+    payload = decode_token(token)
+    if payload is None:
+        raise _credentials_exception()
+    
+    username = payload.get("sub")
+    if username is None:
+        raise _credentials_exception()
+    
+    user = _get_user_cached(db, username)
+    if user is None or not user.is_active:
+        raise _credentials_exception()
+    
+    return user
+
+
+def authenticate_user(db: Session, username: str, password: str) -> Optional[CachedUser]:
     """
     Authenticate a user with username and password.
     
@@ -137,9 +418,10 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
         password: The plain text password
         
     Returns:
-        Optional[User]: The user if authentication succeeds, None otherwise
+        Optional[CachedUser]: The user if authentication succeeds and the
+            account is active, None otherwise
     """
-    user = db.query(User).filter(User.username == username).first()
+    user = _get_user_cached(db, username)
     
     if not user:
         return None
@@ -147,10 +429,32 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
     if not verify_password(password, user.hashed_password):
         return None
     
+    # Checked after the password, so a wrong password can't reveal the account state
+    if not user.is_active:
+        return None
+    
     return user
 
 
-def create_default_user(db: Session) -> User:
+async def authenticate_user_async(db: Session, username: str, password: str) -> Optional[CachedUser]:
+    """
+    Authenticate a user without blocking the event loop.
+    
+    Runs authenticate_user in a worker thread, so other requests keep being
+    served while bcrypt runs.
+    
+    Args:
+        db: Database session
+        username: The username
+        password: The plain text password
+        
+    Returns:
+        Optional[CachedUser]: The user if authentication succeeds, None otherwise
+    """
+    return await asyncio.to_thread(authenticate_user, db, username, password)
+
+
+def create_default_user(db: Session) -> bool:
     """
     Create the default user if it doesn't exist.
     
@@ -158,19 +462,23 @@ def create_default_user(db: Session) -> User:
         db: Database session
         
     Returns:
-        User: The default user
+        bool: True if the user was created, False if it already existed
     """
-    user = db.query(User).filter(User.username == settings.DEFAULT_USERNAME).first()
+    # Existence probe only; the row itself is not needed on the common path
+    exists = db.execute(
+        select(1).where(User.username == settings.DEFAULT_USERNAME).limit(1)
+    ).scalar() is not None
     
-    if not user:
-        user = User(
-            username=settings.DEFAULT_USERNAME,
-            hashed_password=get_password_hash(settings.DEFAULT_PASSWORD),
-            language="en",
-            theme="light"
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+    if exists:
+        return False
     
-    return user
+    user = User(
+        username=settings.DEFAULT_USERNAME,
+        hashed_password=get_password_hash(settings.DEFAULT_PASSWORD),
+        language="en",
+        theme="light"
+    )
+    db.add(user)
+    db.commit()
+    
+    return True
@@ -3,9 +3,10 @@ Application configuration settings.
 """
 
 import os
-from typing import List
+from types import SimpleNamespace
+from typing import FrozenSet, Union
 from pydantic_settings import BaseSettings
-from pydantic import Field
+from pydantic import Field, field_validator
 
 
 class Settings(BaseSettings):
@@ -27,27 +28,62 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = Field(default="HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=1440)  # 24 hours
     
+    # Password hashing
+    BCRYPT_ROUNDS: int = Field(default=12)  # log2 of the bcrypt work factor
+    
     # File upload settings
     UPLOAD_DIR: str = Field(default="/app/uploads")
     MAX_FILE_SIZE: int = Field(default=50 * 1024 * 1024)  # 50MB
-    ALLOWED_EXTENSIONS: List[str] = Field(default=["pdf"])
+    # Hand file downloads to Nginx via X-Accel-Redirect instead of streaming them
+    USE_XACCEL: bool = Field(default=False)
+    XACCEL_PREFIX: str = Field(default="/_internal_uploads/")
+    
+    # PDF processing
+    PDF_WORKERS: int = Field(default=0)  # text extraction processes, 0 = one per CPU
+    OCR_CACHE_DIR: str = Field(default="/app/ocr_cache")  # empty disables the OCR result cache
+    OCR_CACHE_MAX_MB: int = Field(default=256)
+    # Sets give O(1) membership checks. `str` is accepted so that comma-separated
+    # environment values reach the validators below instead of failing JSON parsing.
+    ALLOWED_EXTENSIONS: Union[str, FrozenSet[str]] = Field(default=frozenset({"pdf"}))
     
     # CORS
-    CORS_ORIGINS: List[str] = Field(default=["http://localhost:3000", "http://localhost:80"])
+    CORS_ORIGINS: Union[str, FrozenSet[str]] = Field(
+        default=frozenset({"http://localhost:3000", "http://localhost:80"})
+    )
     
     # Backup settings
     BACKUP_ENABLED: bool = Field(default=True)
     BACKUP_SCHEDULE: str = Field(default="0 2 * * *")  # Daily at 2 AM
     BACKUP_DESTINATION: str = Field(default="/backup")
     
+    # Share links
+    SHARE_LINK_SWEEP_MINUTES: int = Field(default=5)  # how often stale links are deactivated
+    
     # User settings (single user system)
     DEFAULT_USERNAME: str = Field(default="admin")
     DEFAULT_PASSWORD: str = Field(default="admin")  # Change in production!
     
+    @field_validator("ALLOWED_EXTENSIONS", mode="before")
+    @classmethod
+    def _parse_extensions(cls, value):
+        """Normalize extensions to lower case without a leading dot."""
+        if isinstance(value, str):
+            value = value.split(",")
+        return frozenset(ext.strip().lstrip(".").lower() for ext in value if ext.strip())
+    
+    @field_validator("CORS_ORIGINS", mode="before")
+    @classmethod
+    def _parse_origins(cls, value):
+        """Accept a comma-separated string or a list of origins."""
+        if isinstance(value, str):
+            value = value.split(",")
+        return frozenset(origin.strip() for origin in value if origin.strip())
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
 
 
-# Global settings instance
-settings = Settings()
+# Global settings instance: a validated snapshot exposed as plain attributes,
+# so hot paths read settings without going through the pydantic model
+settings = SimpleNamespace(**Settings().model_dump())
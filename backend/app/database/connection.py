@@ -8,6 +8,7 @@ from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 
 from app.config import settings
+from app.database.migrations import upgrade_schema
 
 # Create database engine
 engine = create_engine(
@@ -22,6 +23,7 @@ engine = create_engine(
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
+    expire_on_commit=False,  # sessions are request-scoped; keep loaded state after commit
     bind=engine
 )
 
@@ -44,5 +46,6 @@ def get_db() -> Generator[Session, None, None]:
 
 
 def init_db() -> None:
-    """Initialize database tables."""
+    """Initialize database tables and upgrade existing ones."""
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine, Base.metadata)
@@ -0,0 +1,108 @@
+"""
+In-place schema upgrades for existing databases.
+
+Base.metadata.create_all() creates missing tables but never alters
+tables that already exist, so columns, indexes and extensions added to
+the models later would never reach an existing install. upgrade_schema()
+adds them. Every statement is idempotent, so it runs on each startup.
+"""
+
+import logging
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+logger = logging.getLogger(__name__)
+
+# Serializes upgrades when several app processes start at once
+_UPGRADE_LOCK_ID = 0x48454A4F  # "HEJO"
+
+# Generated columns whose expression changed after release, each with a
+# fragment that only the current expression contains once Postgres renders
+# it. Postgres before 17 can't change a stored expression in place, so an
+# outdated column is dropped (with its indexes) and re-added below.
+_CHANGED_GENERATED_COLUMNS = (
+    ("documents", "extracted_text_tsv", '"left"('),
+)
+
+# Indexes replaced by differently named ones in the models
+_DROPPED_INDEXES = ("ix_docs_owner_tree",)
+
+_GENERATION_EXPRESSION = text(
+    "SELECT pg_get_expr(d.adbin, d.adrelid) FROM pg_attrdef d "
+    "JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum "
+    "WHERE d.adrelid = to_regclass(:table) AND a.attname = :column AND a.attgenerated = 's'"
+)
+
+
+def upgrade_schema(engine: Engine, metadata: MetaData) -> None:
+    """
+    Bring existing tables up to date with the models.
+    
+    Adds missing columns (including generated ones, which Postgres fills
+    in for existing rows), the pg_trgm extension and every index defined
+    on the models. Generated columns whose expression changed are rebuilt
+    and indexes that were replaced are dropped. A step that fails, such as
+    a unique index over rows that are already duplicated, is logged and
+    skipped so the app still starts; the remaining steps are applied.
+    
+    Args:
+        engine: Database engine
+        metadata: Metadata holding the model tables
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _UPGRADE_LOCK_ID})
+        
+        _apply(conn, "CREATE EXTENSION IF NOT EXISTS pg_trgm", "enable pg_trgm")
+        
+        for table, column, fragment in _CHANGED_GENERATED_COLUMNS:
+            expression = conn.execute(_GENERATION_EXPRESSION, {"table": table, "column": column}).scalar()
+            if expression is not None and fragment not in expression:
+                _apply(conn, f'ALTER TABLE "{table}" DROP COLUMN "{column}"', f"drop outdated column {table}.{column}")
+        
+        existing = inspect(conn)
+        for table in metadata.sorted_tables:
+            if not existing.has_table(table.name):
+                continue
+            present = {column["name"] for column in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                definition = CreateColumn(column).compile(dialect=conn.dialect)
+                _apply(
+                    conn,
+                    f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} "
+                    f"ADD COLUMN IF NOT EXISTS {definition}",
+                    f"add column {table.name}.{column.name}"
+                )
+        
+        for name in _DROPPED_INDEXES:
+            _apply(conn, f'DROP INDEX IF EXISTS "{name}"', f"drop index {name}")
+        
+        for table in metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                _apply(conn, CreateIndex(index, if_not_exists=True), f"create index {index.name}")
+
+
+def _apply(conn: Connection, statement, description: str) -> None:
+    """
+    Run one upgrade step in a savepoint, logging instead of raising on failure.
+    
+    Args:
+        conn: Connection inside the upgrade transaction
+        statement: SQL string or DDL element
+        description: What the step does, for the log
+    """
+    if isinstance(statement, str):
+        statement = text(statement)
+    
+    try:
+        with conn.begin_nested():
+            conn.execute(statement)
+    except SQLAlchemyError as e:
+        logger.error("Schema upgrade step failed (%s): %s", description, e.__cause__ or e)
@@ -2,11 +2,20 @@
 Database models for HelseJournal.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, DDL, Integer, String, DateTime, Text, Boolean, ForeignKey, Index, event, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from app.database.connection import Base
 
+# Characters of document text indexed for search. A tsvector is limited to
+# 1 MB and takes at most about 4 bytes per input character, so any longer
+# text is indexed up to this point instead of failing the INSERT.
+SEARCH_TEXT_MAX_CHARS = 200_000
+
+# Tree node for documents without a hospital, whether NULL or empty
+UNKNOWN_HOSPITAL = "Unknown Hospital"
+
 
 class User(Base):
     """User model for authentication."""
@@ -21,6 +30,7 @@ class User(Base):
     language = Column(String(10), default="en")  # 'en' or 'no'
     theme = Column(String(10), default="light")  # 'light' or 'dark'
     is_active = Column(Boolean, default=True)
+    tree_version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped when the document tree changes
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -34,6 +44,13 @@ class Document(Base):
     """Document model for storing PDF metadata."""
     
     __tablename__ = "documents"
+    __mapper_args__ = {
+        "eager_defaults": True,  # fetch server defaults via RETURNING
+        # Generated search columns live only in SQL; unmapped, the ORM never
+        # selects them or reads them back after INSERT/UPDATE. Refer to them
+        # as Document.__table__.c.<name>.
+        "exclude_properties": ["extracted_text_tsv", "hospital_norm"],
+    }
     
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -49,12 +66,24 @@ class Document(Base):
     description = Column(Text, nullable=True)
     year = Column(Integer, nullable=True, index=True)
     hospital = Column(String(255), nullable=True, index=True)
+    hospital_norm = Column(Text, Computed("lower(hospital)", persisted=True))  # for substring filters
     doctor = Column(String(255), nullable=True, index=True)
     document_date = Column(DateTime(timezone=True), nullable=True)
     document_type = Column(String(100), nullable=True)  # 'lab', 'prescription', 'report', etc.
     
-    # Extracted text for search
-    extracted_text = Column(Text, nullable=True)
+    # Extracted text for search. It can be large and is only read inside
+    # search queries, so it is left out of ordinary loads.
+    extracted_text = deferred(Column(Text, nullable=True))
+    extracted_text_tsv = Column(
+        TSVECTOR,
+        # Metadata goes first so a long text can't push it past the limit
+        Computed(
+            "to_tsvector('simple', left(coalesce(title, '') || ' ' || coalesce(hospital, '') || ' ' || "
+            "coalesce(doctor, '') || ' ' || coalesce(description, '') || ' ' || coalesce(extracted_text, ''), "
+            f"{SEARCH_TEXT_MAX_CHARS}))",
+            persisted=True,
+        ),
+    )
     
     # Status
     is_processed = Column(Boolean, default=False)
@@ -74,13 +103,31 @@ class Document(Base):
     __table_args__ = (
         Index('idx_document_year_hospital', 'year', 'hospital'),
         Index('idx_document_search', 'title', 'description'),
+        # Partial index: list endpoints only ever read non-archived documents
+        Index('idx_docs_active', 'owner_id', postgresql_where=text('is_archived = false')),
+        Index('docs_tsv_idx', 'extracted_text_tsv', postgresql_using='gin'),
+        # One copy of a file per owner; also serves the upload duplicate probe
+        Index('ux_docs_owner_hash', 'owner_id', 'file_hash', unique=True),
+        # Match the list and tree endpoints' filters and ORDER BY so no sort is needed
+        Index('ix_docs_owner_created', 'owner_id', 'is_archived', created_at.desc()),
+        Index(
+            'ix_docs_owner_tree_key', 'owner_id', 'is_archived', year.desc().nulls_last(),
+            func.coalesce(func.nullif(hospital, ''), UNKNOWN_HOSPITAL), 'doctor'
+        ),
+        # Trigram index so '%...%' hospital filters don't scan the table
+        Index('ix_docs_hospital_trgm', 'hospital_norm', postgresql_using='gin', postgresql_ops={'hospital_norm': 'gin_trgm_ops'}),
     )
 
 
+# The trigram index above needs pg_trgm to exist before the table is created
+event.listen(Document.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
 class Note(Base):
     """Note model for document annotations."""
     
     __tablename__ = "notes"
+    __mapper_args__ = {"eager_defaults": True}  # fetch server defaults via RETURNING
     
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
@@ -93,12 +140,19 @@ class Note(Base):
     # Relationships
     document = relationship("Document", back_populates="notes")
     owner = relationship("User", back_populates="notes")
+    
+    # Indexes
+    __table_args__ = (
+        # Covers get_notes (filter + ORDER BY) and per-document note counts
+        Index('ix_notes_doc_owner_created', 'document_id', 'owner_id', created_at.desc()),
+    )
 
 
 class ShareLink(Base):
     """Share link model for secure document sharing."""
     
     __tablename__ = "share_links"
+    __mapper_args__ = {"eager_defaults": True}  # fetch server defaults via RETURNING
     
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
@@ -129,3 +183,9 @@ class Notification(Base):
     
     # Relationships
     user = relationship("User", back_populates="notifications")
+    
+    # Indexes
+    __table_args__ = (
+        # Partial index: only unread notifications are looked up per user
+        Index('idx_notifications_unread', 'user_id', postgresql_where=text('is_read = false')),
+    )
@@ -2,26 +2,49 @@
 Documents router for HelseJournal.
 """
 
+import contextlib
 import os
 import hashlib
+import logging
+import re
+import secrets
 import uuid
-from datetime import datetime, timedelta
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, status
-from fastapi.responses import FileResponse, StreamingResponse
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, UploadFile, File, Form, Query, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import func, desc, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 import io
+import aiofiles
+import orjson
 
 from app.config import settings
-from app.database.connection import get_db
-from app.database.models import User, Document, Note, ShareLink, Notification
-from app.auth.security import get_current_user
+from app.database.connection import SessionLocal, get_db
+from app.database.models import UNKNOWN_HOSPITAL, Document, Note, ShareLink, Notification, User
+from app.auth.security import get_current_user_claims, UserClaims
 from app.pdf_processor.extractor import extract_text_from_pdf, get_pdf_info
+from app.pdf_processor.ocr_cache import forget_document
+from app.pdf_processor.pool import run_in_pdf_pool
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Read size for streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# File extensions kept on stored uploads
+_SAFE_EXTENSION = re.compile(r"[A-Za-z0-9]{1,10}")
+
+# Serialized document tree per user: user_id -> (tree_version, json_bytes).
+# An entry is valid while users.tree_version still matches.
+_tree_cache: Dict[int, Tuple[int, bytes]] = {}
+
 
 # Pydantic models
 class DocumentResponse(BaseModel):
@@ -109,6 +132,9 @@ class TreeItem(BaseModel):
 
 TreeItem.model_rebuild()
 
+# Columns copied straight from Document rows when building list responses
+_DOCUMENT_FIELDS = tuple(name for name in DocumentResponse.model_fields if name != "note_count")
+
 
 class SearchResult(BaseModel):
     """Search result model."""
@@ -122,84 +148,297 @@ class SearchResult(BaseModel):
     score: float
 
 
-def calculate_file_hash(file_content: bytes) -> str:
-    """Calculate SHA-256 hash of file content."""
-    return hashlib.sha256(file_content).hexdigest()
+# Generated search columns, which are not mapped on Document
+_DOCUMENT_TSV = Document.__table__.c.extracted_text_tsv
+_HOSPITAL_NORM = Document.__table__.c.hospital_norm
+
+# Correlated note count for single-document reads, so the notes collection
+# is never loaded just to be measured.
+_NOTE_COUNT = func.coalesce(
+    select(func.count(Note.id))
+    .where(Note.document_id == Document.id)
+    .correlate(Document)
+    .scalar_subquery(),
+    0
+).label("note_count")
+
+
+# Tree grouping key; a NULL and an empty hospital land in the same node.
+# Matches the expression in ix_docs_owner_tree_key, so the tree query
+# still reads rows in index order.
+_TREE_HOSPITAL = func.coalesce(func.nullif(Document.hospital, ""), UNKNOWN_HOSPITAL).label("tree_hospital")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag.
+    
+    The header may list several tags or be "*". Tags are compared weakly,
+    as If-None-Match requires, so W/"x" and "x" match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def generate_unique_filename(original_filename: Optional[str]) -> str:
+    """
+    Generate a unique filename, keeping the original extension if it is safe.
+    
+    The client's name may contain path separators or anything else, so only
+    the extension of its last path component is kept, and only if it is
+    plain alphanumerics; otherwise the file is stored as ".pdf".
+    """
+    basename = os.path.basename((original_filename or "").replace("\\", "/"))
+    _, dot, ext = basename.rpartition(".")
+    if not (dot and _SAFE_EXTENSION.fullmatch(ext)):
+        ext = "pdf"
+    return f"{secrets.token_hex(16)}.{ext}"
+
+
+def remove_stored_file(file_path: str) -> None:
+    """Delete an uploaded file and the OCR text cached from its pages."""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(file_path)
+    forget_document(file_path)
+
+
+def bump_tree_version(db: Session, user_id: int) -> None:
+    """
+    Invalidate the cached document tree for a user.
+    
+    Runs inside the caller's transaction, so the bump commits together
+    with the change that made the tree stale.
+    
+    Args:
+        db: Database session
+        user_id: Owner of the changed document
+    """
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(tree_version=User.tree_version + 1)
+    )
+
+
+def create_upload_notification(user_id: int, document_id: int, title: str) -> None:
+    """
+    Record the "document uploaded" notification.
+    
+    Runs as a background task after the upload response is sent, so it uses
+    its own session rather than the request's.
+    
+    Args:
+        user_id: Owner of the uploaded document
+        document_id: The uploaded document
+        title: Document title shown in the message
+    """
+    db = SessionLocal()
+    try:
+        db.execute(insert(Notification).values(
+            user_id=user_id,
+            title="New document uploaded",
+            message=f"'{title}' has been uploaded successfully",
+            notification_type="success",
+            related_document_id=document_id
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def deactivate_stale_share_links() -> int:
+    """
+    Deactivate share links that have expired or used up their views.
+    
+    Runs periodically from the application scheduler, keeping the write
+    off the share-link access path.
+    
+    Returns:
+        int: Number of links deactivated
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(ShareLink)
+            .where(
+                ShareLink.is_active == True,
+                or_(
+                    ShareLink.expires_at <= func.now(),
+                    ShareLink.view_count >= ShareLink.max_views
+                )
+            )
+            .values(is_active=False)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def document_file_response(document: Document) -> Response:
+    """
+    Build the download response for a document's PDF.
+    
+    With USE_XACCEL the body is left to Nginx, which serves the file from
+    its internal location via sendfile and returns 404 if it is missing.
+    
+    Args:
+        document: The document to serve
+        
+    Returns:
+        Response: X-Accel-Redirect response or FileResponse
+        
+    Raises:
+        HTTPException: If the file is missing and is served directly
+    """
+    if settings.USE_XACCEL:
+        filename = quote(document.original_filename)
+        if filename != document.original_filename:
+            disposition = f"attachment; filename*=utf-8''{filename}"
+        else:
+            disposition = f'attachment; filename="{filename}"'
+        return Response(
+            media_type="application/pdf",
+            headers={
+                "X-Accel-Redirect": f"{settings.XACCEL_PREFIX}{document.file_path}",
+                "Content-Disposition": disposition
+            }
+        )
+    
+    file_path = os.path.join(settings.UPLOAD_DIR, document.file_path)
+    
+    if not os.path.exists(file_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    return FileResponse(
+        file_path,
+        filename=document.original_filename,
+        media_type="application/pdf"
+    )
 
 
-def generate_unique_filename(original_filename: str) -> str:
-    """Generate a unique filename."""
-    ext = os.path.splitext(original_filename)[1]
-    return f"{uuid.uuid4().hex}{ext}"
+async def get_owned_document(
+    document_id: int,
+    current_user: UserClaims = Depends(get_current_user_claims),
+    db: Session = Depends(get_db)
+) -> Document:
+    """
+    Load a document owned by the current user, or raise 404.
+    
+    Depends on the same callables as the routes themselves, so FastAPI's
+    per-request dependency cache resolves the user and session only once.
+    
+    Args:
+        document_id: Document ID
+        current_user: The authenticated user
+        db: Database session
+        
+    Returns:
+        Document: The requested document
+        
+    Raises:
+        HTTPException: If the document does not exist or is not owned by the user
+    """
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.owner_id == current_user.id
+    ).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    return document
 
 
-@router.get("/tree", response_model=List[TreeItem])
+@router.get("/tree", response_model=None, responses={200: {"model": List[TreeItem]}})
 async def get_document_tree(
-    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
     Get documents organized in a tree structure: Year -> Hospital/Doctor -> Documents.
     
+    The serialized tree is cached per user and reused until the user's
+    tree_version is bumped by a document change. The version doubles as
+    the ETag, so clients revalidating an unchanged tree get a 304.
+    
     Args:
+        if_none_match: ETag from the client's cached copy
         current_user: The authenticated user
         db: Database session
         
     Returns:
-        List[TreeItem]: Tree structure of documents
+        Response: JSON-encoded list of TreeItem, or 304 Not Modified
     """
-    documents = db.query(Document).filter(
+    version = db.query(User.tree_version).filter(User.id == current_user.id).scalar()
+    headers = {
+        "ETag": f'W/"tree-{current_user.id}-{version}"',
+        "Cache-Control": "private, no-cache"
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    cached = _tree_cache.get(current_user.id)
+    if cached and cached[0] == version:
+        return Response(content=cached[1], media_type="application/json", headers=headers)
+    
+    rows = db.query(Document, _TREE_HOSPITAL).options(
+        load_only(
+            Document.id, Document.title, Document.original_filename,
+            Document.year, Document.doctor
+        )
+    ).filter(
         Document.owner_id == current_user.id,
         Document.is_archived == False
-    ).order_by(desc(Document.year), Document.hospital, Document.doctor).all()
-    
-    # Build tree structure
-    tree = {}
+    ).order_by(desc(Document.year).nulls_last(), _TREE_HOSPITAL, Document.doctor).all()
     
-    for doc in documents:
-        year = doc.year or 0
-        hospital = doc.hospital or "Unknown Hospital"
-        
-        if year not in tree:
-            tree[year] = {}
-        
-        if hospital not in tree[year]:
-            tree[year][hospital] = []
-        
-        tree[year][hospital].append(doc)
-    
-    # Convert to TreeItem structure
+    # Rows arrive grouped by year and hospital, so one pass builds the tree.
+    # Nodes are plain dicts with the same keys TreeItem would serialize.
     result = []
-    for year in sorted(tree.keys(), reverse=True):
-        year_node = TreeItem(
-            id=f"year_{year}",
-            name=str(year) if year > 0 else "Unknown Year",
-            type="year",
-            children=[]
-        )
+    for year, year_rows in groupby(rows, key=lambda row: row[0].year or 0):
+        year_node = {
+            "id": f"year_{year}",
+            "name": str(year) if year > 0 else "Unknown Year",
+            "type": "year",
+            "children": [],
+            "document_id": None
+        }
         
-        for hospital in sorted(tree[year].keys()):
-            hospital_node = TreeItem(
-                id=f"hospital_{year}_{hospital}",
-                name=hospital,
-                type="hospital",
-                children=[]
-            )
-            
-            for doc in tree[year][hospital]:
-                doc_node = TreeItem(
-                    id=f"doc_{doc.id}",
-                    name=doc.title or doc.original_filename,
-                    type="document",
-                    document_id=doc.id
-                )
-                hospital_node.children.append(doc_node)
-            
-            year_node.children.append(hospital_node)
+        for hospital, hospital_rows in groupby(year_rows, key=lambda row: row[1]):
+            year_node["children"].append({
+                "id": f"hospital_{year}_{hospital}",
+                "name": hospital,
+                "type": "hospital",
+                "children": [
+                    {
+                        "id": f"doc_{doc.id}",
+                        "name": doc.title or doc.original_filename,
+                        "type": "document",
+                        "children": None,
+                        "document_id": doc.id
+                    }
+                    for doc, _ in hospital_rows
+                ],
+                "document_id": None
+            })
         
         result.append(year_node)
     
-    return result
+    content = orjson.dumps(result)
+    _tree_cache[current_user.id] = (version, content)
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @router.get("/search")
@@ -207,7 +446,7 @@ async def search_documents(
     q: str = Query(..., min_length=1, description="Search query"),
     year: Optional[int] = Query(None, description="Filter by year"),
     hospital: Optional[str] = Query(None, description="Filter by hospital"),
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -223,39 +462,27 @@ async def search_documents(
     Returns:
         List[SearchResult]: Search results
     """
-    query = db.query(Document).filter(
+    tsq = func.plainto_tsquery('simple', q)
+    rank = func.ts_rank_cd(_DOCUMENT_TSV, tsq).label("rank")
+    highlight = func.ts_headline(
+        'simple', Document.extracted_text, tsq,
+        'MaxWords=20, MinWords=5, StartSel="", StopSel=""'
+    ).label("highlight")
+    
+    query = db.query(Document, rank, highlight).filter(
         Document.owner_id == current_user.id,
-        Document.is_archived == False
+        Document.is_archived == False,
+        _DOCUMENT_TSV.op('@@')(tsq)
     )
     
     # Apply filters
     if year:
         query = query.filter(Document.year == year)
     if hospital:
-        query = query.filter(Document.hospital.ilike(f"%{hospital}%"))
-    
-    # Full-text search on title, description, and extracted text
-    search_filter = (
-        Document.title.ilike(f"%{q}%") |
-        Document.description.ilike(f"%{q}%") |
-        Document.extracted_text.ilike(f"%{q}%") |
-        Document.hospital.ilike(f"%{q}%") |
-        Document.doctor.ilike(f"%{q}%")
-    )
-    query = query.filter(search_filter)
-    
-    documents = query.all()
+        query = query.filter(_HOSPITAL_NORM.contains(hospital.lower(), autoescape=True))
     
     results = []
-    for doc in documents:
-        # Create highlight snippet
-        highlight = None
-        if doc.extracted_text and q.lower() in doc.extracted_text.lower():
-            idx = doc.extracted_text.lower().find(q.lower())
-            start = max(0, idx - 50)
-            end = min(len(doc.extracted_text), idx + len(q) + 50)
-            highlight = f"...{doc.extracted_text[start:end]}..."
-        
+    for doc, score, snippet in query.order_by(rank.desc()).all():
         results.append(SearchResult(
             id=doc.id,
             title=doc.title or doc.original_filename,
@@ -263,21 +490,21 @@ async def search_documents(
             year=doc.year,
             hospital=doc.hospital,
             doctor=doc.doctor,
-            highlight=highlight,
-            score=1.0  # Simple scoring, could be improved with Elasticsearch
+            highlight=f"...{snippet}..." if snippet else None,
+            score=score
         ))
     
     return results
 
 
-@router.get("/", response_model=List[DocumentResponse])
+@router.get("/", response_model=None, responses={200: {"model": List[DocumentResponse]}})
 async def list_documents(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     year: Optional[int] = Query(None),
     hospital: Optional[str] = Query(None),
     is_favorite: Optional[bool] = Query(None),
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -295,7 +522,19 @@ async def list_documents(
     Returns:
         List[DocumentResponse]: List of documents
     """
-    query = db.query(Document).filter(
+    # Only this user's notes are counted, which ix_notes_doc_owner_created covers
+    note_count_sq = db.query(
+        Note.document_id,
+        func.count(Note.id).label("nc")
+    ).filter(
+        Note.owner_id == current_user.id
+    ).group_by(Note.document_id).subquery()
+    
+    query = db.query(Document, func.coalesce(note_count_sq.c.nc, 0)).options(
+        load_only(*(getattr(Document, name) for name in _DOCUMENT_FIELDS))
+    ).outerjoin(
+        note_count_sq, note_count_sq.c.document_id == Document.id
+    ).filter(
         Document.owner_id == current_user.id,
         Document.is_archived == False
     )
@@ -303,25 +542,23 @@ async def list_documents(
     if year:
         query = query.filter(Document.year == year)
     if hospital:
-        query = query.filter(Document.hospital.ilike(f"%{hospital}%"))
+        query = query.filter(_HOSPITAL_NORM.contains(hospital.lower(), autoescape=True))
     if is_favorite is not None:
         query = query.filter(Document.is_favorite == is_favorite)
     
-    documents = query.order_by(desc(Document.created_at)).offset(skip).limit(limit).all()
-    
-    # Add note count
-    result = []
-    for doc in documents:
-        doc.note_count = len(doc.notes)
-        result.append(doc)
+    rows = query.order_by(desc(Document.created_at)).offset(skip).limit(limit).all()
     
-    return result
+    # Build plain dicts so the response skips per-row model validation
+    return [
+        {**{name: getattr(doc, name) for name in _DOCUMENT_FIELDS}, "note_count": note_count}
+        for doc, note_count in rows
+    ]
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -335,66 +572,40 @@ async def get_document(
     Returns:
         DocumentResponse: Document details
     """
-    document = db.query(Document).filter(
+    row = db.query(Document, _NOTE_COUNT).filter(
         Document.id == document_id,
         Document.owner_id == current_user.id
     ).first()
     
-    if not document:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    document.note_count = len(document.notes)
+    document, document.note_count = row
     return document
 
 
 @router.get("/{document_id}/view")
 async def view_document(
-    document_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    document: Document = Depends(get_owned_document)
 ):
     """
     View/download a document file.
     
     Args:
-        document_id: Document ID
-        current_user: The authenticated user
-        db: Database session
+        document: The requested document
         
     Returns:
-        FileResponse: PDF file
+        Response: PDF file
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
-    file_path = os.path.join(settings.UPLOAD_DIR, document.file_path)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found"
-        )
-    
-    return FileResponse(
-        file_path,
-        filename=document.original_filename,
-        media_type="application/pdf"
-    )
+    return document_file_response(document)
 
 
 @router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
@@ -403,13 +614,14 @@ async def upload_document(
     doctor: Optional[str] = Form(None),
     document_date: Optional[str] = Form(None),
     document_type: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
     Upload a new PDF document.
     
     Args:
+        background_tasks: Tasks run after the response is sent
         file: PDF file to upload
         title: Document title
         description: Document description
@@ -431,46 +643,57 @@ async def upload_document(
             detail="Only PDF files are allowed"
         )
     
-    # Read file content
-    content = await file.read()
-    
-    # Check file size
-    if len(content) > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Calculate file hash
-    file_hash = calculate_file_hash(content)
+    # Generate unique filename
+    unique_filename = generate_unique_filename(file.filename)
+    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
+    tmp_path = file_path + ".part"
     
-    # Check for duplicate
-    existing = db.query(Document).filter(
-        Document.owner_id == current_user.id,
-        Document.file_hash == file_hash
+    # Stream to a temporary file, hashing and size-checking as we go
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
+                    )
+                hasher.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        # Never let cleanup mask the original error
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    
+    file_hash = hasher.hexdigest()
+    
+    # Check for duplicate before the file is moved into place
+    existing = db.execute(
+        select(1).where(
+            Document.owner_id == current_user.id,
+            Document.file_hash == file_hash
+        ).limit(1)
     ).first()
     
     if existing:
+        os.remove(tmp_path)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="This document already exists"
         )
     
-    # Generate unique filename
-    unique_filename = generate_unique_filename(file.filename)
-    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-    
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(content)
+    os.replace(tmp_path, file_path)
     
     # Extract text from PDF
     extracted_text = ""
     try:
-        extracted_text = extract_text_from_pdf(file_path)
-    except Exception as e:
+        extracted_text = await run_in_pdf_pool(extract_text_from_pdf, file_path)
+    except Exception:
         # Log error but don't fail upload
-        print(f"Failed to extract text: {e}")
+        logger.exception("Failed to extract text", extra={"stored_filename": unique_filename})
     
     # Parse document date
     parsed_date = None
@@ -486,7 +709,7 @@ async def upload_document(
         filename=unique_filename,
         original_filename=file.filename,
         file_path=unique_filename,
-        file_size=len(content),
+        file_size=size,
         file_hash=file_hash,
         title=title or file.filename,
         description=description,
@@ -500,19 +723,25 @@ async def upload_document(
     )
     
     db.add(document)
-    db.commit()
-    db.refresh(document)
-    
-    # Create notification
-    notification = Notification(
-        user_id=current_user.id,
-        title="New document uploaded",
-        message=f"'{document.title}' has been uploaded successfully",
-        notification_type="success",
-        related_document_id=document.id
-    )
-    db.add(notification)
-    db.commit()
+    try:
+        bump_tree_version(db, current_user.id)
+        db.commit()
+    except IntegrityError:
+        # A concurrent upload of the same file won the unique index
+        db.rollback()
+        remove_stored_file(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This document already exists"
+        )
+    except BaseException:
+        # Don't leave a stored file that no document row points to
+        db.rollback()
+        remove_stored_file(file_path)
+        raise
+    
+    # Notify once the response is on its way
+    background_tasks.add_task(create_upload_notification, current_user.id, document.id, document.title)
     
     document.note_count = 0
     return document
@@ -522,7 +751,7 @@ async def upload_document(
 async def update_document(
     document_id: int,
     document_update: DocumentCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -537,63 +766,51 @@ async def update_document(
     Returns:
         DocumentResponse: Updated document
     """
-    document = db.query(Document).filter(
+    row = db.query(Document, _NOTE_COUNT).filter(
         Document.id == document_id,
         Document.owner_id == current_user.id
     ).first()
     
-    if not document:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
+    document, note_count = row
+    
     # Update fields
-    for field, value in document_update.dict(exclude_unset=True).items():
+    for field, value in document_update.model_dump(exclude_unset=True).items():
         setattr(document, field, value)
     
+    bump_tree_version(db, current_user.id)
     db.commit()
-    db.refresh(document)
     
-    document.note_count = len(document.notes)
+    document.note_count = note_count
     return document
 
 
 @router.delete("/{document_id}")
 async def delete_document(
-    document_id: int,
-    current_user: User = Depends(get_current_user),
+    document: Document = Depends(get_owned_document),
     db: Session = Depends(get_db)
 ):
     """
     Delete a document.
     
     Args:
-        document_id: Document ID
-        current_user: The authenticated user
+        document: The document to delete
         db: Database session
         
     Returns:
         dict: Success message
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
-    # Delete file
-    file_path = os.path.join(settings.UPLOAD_DIR, document.file_path)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Delete the file and any OCR text cached from it
+    remove_stored_file(os.path.join(settings.UPLOAD_DIR, document.file_path))
     
     # Delete from database
     db.delete(document)
+    bump_tree_version(db, document.owner_id)
     db.commit()
     
     return {"message": "Document deleted successfully"}
@@ -601,43 +818,35 @@ async def delete_document(
 
 @router.post("/{document_id}/favorite")
 async def toggle_favorite(
-    document_id: int,
-    current_user: User = Depends(get_current_user),
+    document: Document = Depends(get_owned_document),
     db: Session = Depends(get_db)
 ):
     """
     Toggle favorite status for a document.
     
     Args:
-        document_id: Document ID
-        current_user: The authenticated user
+        document: The document to update
         db: Database session
         
     Returns:
         dict: New favorite status
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
     document.is_favorite = not document.is_favorite
+    bump_tree_version(db, document.owner_id)
     db.commit()
     
     return {"is_favorite": document.is_favorite}
 
 
 # Notes endpoints
-@router.get("/{document_id}/notes", response_model=List[NoteResponse])
+@router.get(
+    "/{document_id}/notes",
+    response_model=List[NoteResponse],
+    dependencies=[Depends(get_owned_document)]
+)
 async def get_notes(
     document_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -651,17 +860,6 @@ async def get_notes(
     Returns:
         List[NoteResponse]: List of notes
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
     notes = db.query(Note).filter(
         Note.document_id == document_id,
         Note.owner_id == current_user.id
@@ -670,11 +868,16 @@ async def get_notes(
     return notes
 
 
-@router.post("/{document_id}/notes", response_model=NoteResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/{document_id}/notes",
+    response_model=NoteResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(get_owned_document)]
+)
 async def create_note(
     document_id: int,
     note_data: NoteCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -689,17 +892,6 @@ async def create_note(
     Returns:
         NoteResponse: Created note
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
     note = Note(
         document_id=document_id,
         owner_id=current_user.id,
@@ -709,7 +901,6 @@ async def create_note(
     
     db.add(note)
     db.commit()
-    db.refresh(note)
     
     return note
 
@@ -718,7 +909,7 @@ async def create_note(
 async def delete_note(
     document_id: int,
     note_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -752,11 +943,14 @@ async def delete_note(
 
 
 # Share link endpoints
-@router.post("/{document_id}/share", response_model=ShareLinkResponse)
+@router.post(
+    "/{document_id}/share",
+    response_model=ShareLinkResponse,
+    dependencies=[Depends(get_owned_document)]
+)
 async def create_share_link(
     document_id: int,
     share_data: ShareLinkCreate,
-    current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -765,30 +959,18 @@ async def create_share_link(
     Args:
         document_id: Document ID
         share_data: Share link configuration
-        current_user: The authenticated user
         db: Database session
         
     Returns:
         ShareLinkResponse: Created share link
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
     # Generate unique token
     token = uuid.uuid4().hex
     
     # Calculate expiration
     expires_at = None
     if share_data.expires_in_days:
-        expires_at = datetime.utcnow() + timedelta(days=share_data.expires_in_days)
+        expires_at = datetime.now(timezone.utc) + timedelta(days=share_data.expires_in_days)
     
     share_link = ShareLink(
         document_id=document_id,
@@ -799,7 +981,6 @@ async def create_share_link(
     
     db.add(share_link)
     db.commit()
-    db.refresh(share_link)
     
     # Add share URL
     share_link.share_url = f"/api/documents/share/{token}"
@@ -820,8 +1001,33 @@ async def access_shared_document(
         db: Database session
         
     Returns:
-        FileResponse: Shared PDF file
+        Response: Shared PDF file
     """
+    # Count the view and fetch the file in one statement; the limits are
+    # enforced in the WHERE clause so concurrent views cannot overshoot them.
+    # Issued against the tables directly, as ORM RETURNING cannot map
+    # columns from the joined documents table.
+    links = ShareLink.__table__
+    documents = Document.__table__
+    document = db.execute(
+        update(links)
+        .where(
+            links.c.token == token,
+            links.c.is_active == True,
+            links.c.document_id == documents.c.id,
+            or_(links.c.expires_at.is_(None), links.c.expires_at > func.now()),
+            or_(links.c.max_views.is_(None), links.c.view_count < links.c.max_views)
+        )
+        .values(view_count=links.c.view_count + 1)
+        .returning(documents.c.file_path, documents.c.original_filename)
+    ).first()
+    
+    if document:
+        db.commit()
+        return document_file_response(document)
+    
+    # Work out why the link was refused. Stale links are deactivated by the
+    # periodic sweep, so this path only reads.
     share_link = db.query(ShareLink).filter(
         ShareLink.token == token,
         ShareLink.is_active == True
@@ -833,42 +1039,10 @@ async def access_shared_document(
             detail="Share link not found or expired"
         )
     
-    # Check expiration
-    if share_link.expires_at and share_link.expires_at < datetime.utcnow():
-        share_link.is_active = False
-        db.commit()
-        raise HTTPException(
-            status_code=status.HTTP_410_GONE,
-            detail="Share link has expired"
-        )
-    
-    # Check max views
-    if share_link.max_views and share_link.view_count >= share_link.max_views:
-        share_link.is_active = False
-        db.commit()
-        raise HTTPException(
-            status_code=status.HTTP_410_GONE,
-            detail="Share link has reached maximum views"
-        )
-    
-    # Increment view count
-    share_link.view_count += 1
-    db.commit()
-    
-    # Return document
-    document = share_link.document
-    file_path = os.path.join(settings.UPLOAD_DIR, document.file_path)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found"
-        )
-    
-    return FileResponse(
-        file_path,
-        filename=document.original_filename,
-        media_type="application/pdf"
+    expired = share_link.expires_at is not None and share_link.expires_at <= datetime.now(timezone.utc)
+    raise HTTPException(
+        status_code=status.HTTP_410_GONE,
+        detail="Share link has expired" if expired else "Share link has reached maximum views"
     )
 
 
@@ -876,7 +1050,7 @@ async def access_shared_document(
 async def revoke_share_link(
     document_id: int,
     share_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserClaims = Depends(get_current_user_claims),
     db: Session = Depends(get_db)
 ):
     """
@@ -891,19 +1065,23 @@ async def revoke_share_link(
     Returns:
         dict: Success message
     """
-    share_link = db.query(ShareLink).filter(
+    row = db.query(ShareLink, Document.owner_id).join(
+        Document, ShareLink.document_id == Document.id
+    ).filter(
         ShareLink.id == share_id,
         ShareLink.document_id == document_id
     ).first()
     
-    if not share_link:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Share link not found"
         )
     
+    share_link, owner_id = row
+    
     # Verify ownership
-    if share_link.document.owner_id != current_user.id:
+    if owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to revoke this share link"
@@ -0,0 +1,57 @@
+"""
+Logging configuration.
+"""
+
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.config import settings
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def _log_level() -> int:
+    """Return the root log level for the current settings."""
+    return logging.DEBUG if settings.DEBUG else logging.INFO
+
+
+def start_logging() -> None:
+    """
+    Route application log records through a queue.
+
+    Request handlers only enqueue records; a background listener thread
+    formats them and writes them to stderr.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(_log_level())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+
+    _listener.stop()
+    _listener = None
+
+
+def configure_worker_logging() -> None:
+    """Set up plain stderr logging in PDF worker processes."""
+    logging.basicConfig(level=_log_level(), format=LOG_FORMAT)
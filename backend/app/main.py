@@ -2,29 +2,69 @@
 Main FastAPI application entry point.
 """
 
+from contextlib import asynccontextmanager
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+import orjson
 import os
 
 from app.config import settings
-from app.database.connection import engine, Base
+from app.database.connection import engine, Base, SessionLocal
+from app.database.migrations import upgrade_schema
+from app.auth.security import create_default_user
+from app.logging_config import start_logging, stop_logging
+from app.pdf_processor.pool import shutdown_pdf_pool
 from app.auth.router import router as auth_router
-from app.documents.router import router as documents_router
+from app.documents.router import router as documents_router, deactivate_stale_share_links
 
-# Create database tables
+# Create database tables, then add anything newer to tables that already existed
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine, Base.metadata)
 
 # Create upload directory if it doesn't exist
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run one-time startup tasks before serving requests, and clean up after."""
+    start_logging()
+    
+    # Ensure default user exists
+    db = SessionLocal()
+    try:
+        create_default_user(db)
+    finally:
+        db.close()
+    
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        deactivate_stale_share_links,
+        "interval",
+        minutes=settings.SHARE_LINK_SWEEP_MINUTES,
+        coalesce=True,
+        max_instances=1
+    )
+    scheduler.start()
+    
+    yield
+    
+    scheduler.shutdown(wait=False)
+    shutdown_pdf_pool()
+    stop_logging()
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     description="A secure personal health journal for organizing medical documents",
     version=settings.APP_VERSION,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -44,52 +84,62 @@ app.include_router(documents_router, prefix="/api/documents", tags=["Documents"]
 app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
 
+# Bodies of the static endpoints, serialized once at import. Each request
+# still gets a fresh Response: middleware appends to a response's headers
+# in place, so a shared instance would accumulate them.
+_ROOT_BODY = orjson.dumps({
+    "name": settings.APP_NAME,
+    "version": settings.APP_VERSION,
+    "status": "running"
+})
+_HEALTH_BODY = orjson.dumps({"status": "healthy"})
+_INFO_BODY = orjson.dumps({
+    "name": settings.APP_NAME,
+    "version": settings.APP_VERSION,
+    "features": [
+        "dark_mode",
+        "multi_language",
+        "tree_structure",
+        "pdf_viewer",
+        "full_text_search",
+        "upload",
+        "authentication",
+        "notes",
+        "notifications",
+        "sharing",
+        "backup",
+        "responsive"
+    ],
+    "languages": ["en", "no"]
+})
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
-    return {
-        "name": settings.APP_NAME,
-        "version": settings.APP_VERSION,
-        "status": "running"
-    }
+    return Response(_ROOT_BODY, media_type="application/json", headers={"Cache-Control": "no-store"})
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"}
+    return Response(_HEALTH_BODY, media_type="application/json", headers={"Cache-Control": "no-store"})
 
 
 @app.get("/api/info")
 async def api_info():
     """API information endpoint."""
-    return {
-        "name": settings.APP_NAME,
-        "version": settings.APP_VERSION,
-        "features": [
-            "dark_mode",
-            "multi_language",
-            "tree_structure",
-            "pdf_viewer",
-            "full_text_search",
-            "upload",
-            "authentication",
-            "notes",
-            "notifications",
-            "sharing",
-            "backup",
-            "responsive"
-        ],
-        "languages": ["en", "no"]
-    }
+    return Response(_INFO_BODY, media_type="application/json", headers={"Cache-Control": "public, max-age=3600"})
 
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Custom HTTP exception handler."""
+    # Keep the exception's headers, e.g. WWW-Authenticate on a 401
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=exc.headers
     )
 
 
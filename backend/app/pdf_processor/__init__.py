@@ -9,9 +9,12 @@ from app.pdf_processor.extractor import (
     get_pdf_info,
     extract_metadata,
 )
+from app.pdf_processor.pool import run_in_pdf_pool, shutdown_pdf_pool
 
 __all__ = [
     "extract_text_from_pdf",
     "get_pdf_info",
     "extract_metadata",
+    "run_in_pdf_pool",
+    "shutdown_pdf_pool",
 ]
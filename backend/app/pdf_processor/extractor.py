@@ -2,18 +2,493 @@
 PDF text extraction utilities.
 """
 
+import logging
+import operator
 import os
-from typing import Optional, Dict, Any
+import statistics
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterable, List, Tuple, Union
 import fitz  # PyMuPDF
-from pdf2image import convert_from_path
+from PIL import Image
 import pytesseract
 
+from app.config import settings
+from app.pdf_processor.ocr_cache import (
+    get_cached_text,
+    ocr_cache_enabled,
+    ocr_cache_key,
+    remember_document_keys,
+    store_text,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pages are OCR'd in parallel, one Tesseract process each; keep every
+# process single-threaded so they don't oversubscribe the CPUs
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _ocr_worker_count(cpus: int, pdf_workers: int) -> int:
+    """
+    Number of Tesseract processes each PDF pool worker may run at once.
+    
+    With the default pool size (pdf_workers 0, one process per CPU) uploads
+    are usually processed one at a time, so a single document gets every
+    CPU. A pool size set explicitly means concurrent uploads are expected,
+    and the CPUs are split between its workers.
+    
+    Args:
+        cpus: Number of CPUs
+        pdf_workers: The PDF_WORKERS setting
+        
+    Returns:
+        int: OCR threads per document
+    """
+    if not pdf_workers:
+        return cpus
+    return max(1, cpus // pdf_workers)
+
+
+OCR_WORKERS = _ocr_worker_count(os.cpu_count() or 1, settings.PDF_WORKERS)
+# Pages per Tesseract run; batching amortizes its startup and model load
+OCR_BATCH_PAGES = 4
+
+
+# A page with more embedded text than this is treated as born-digital
+DIGITAL_TEXT_MIN_CHARS = 100
+# Pages whose images cover less than this share of the page are digital too
+SCANNED_IMAGE_COVERAGE = 0.3
+# Plain-text extraction flags: keep whitespace and clip to the mediabox as
+# MuPDF's defaults do, but expand ligatures ("ﬁ" -> "fi") instead of keeping
+# the ligature glyph, which also makes the text searchable as typed
+TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+OCR_DPI = 200
+OCR_LANG = "nor+eng"
+# LSTM engine only, one uniform block of text. Debian's tesseract-ocr-nor and
+# tesseract-ocr-eng packages ship the tessdata_fast models this is tuned for.
+OCR_CONFIG = "--oem 1 --psm 6 -c preserve_interword_spaces=1"
+
+# Scanned pages are rendered at a resolution picked from their estimated font
+# size in points: large print is read fine at 150 dpi, small print needs 300
+OCR_DPI_LARGE_TEXT = 150
+OCR_DPI_SMALL_TEXT = 300
+LARGE_TEXT_MIN_PT = 14
+SMALL_TEXT_MAX_PT = 9
+# The text size is measured on a preview with this many pixels per point
+SIZE_PREVIEW_SCALE = 2
+
+
+def _page_is_digital(page: fitz.Page, textpage: fitz.TextPage, text: str) -> bool:
+    """
+    Decide whether a page can be read from its text layer.
+    
+    Args:
+        page: The PDF page
+        textpage: The page's TextPage, built with TEXT_PRESERVE_IMAGES
+        text: Text already extracted from the page
+        
+    Returns:
+        bool: True if the page needs no OCR
+    """
+    if len(text.strip()) > DIGITAL_TEXT_MIN_CHARS:
+        return True
+    
+    page_area = abs(page.rect)
+    if not page_area:
+        return True
+    
+    image_area = sum(abs(fitz.Rect(image["bbox"]) & page.rect) for image in textpage.extractIMGINFO())
+    return image_area / page_area < SCANNED_IMAGE_COVERAGE
+
+
+def _render_page_to_pil(page: fitz.Page, dpi: int = OCR_DPI) -> Image.Image:
+    """
+    Render a page in-process with PyMuPDF for OCR.
+    
+    Pages are rendered in grayscale, which is all Tesseract uses and a third
+    of the RGB size. The image wraps the pixmap's memory without a copy.
+    
+    pytesseract hands images to Tesseract through a temporary file in the
+    image's format, PNG by default. Marking the image as PPM makes that a
+    raw PGM write (about 2 ms for an A4 page at 200 dpi, against ~75 ms
+    for PNG compression) that Leptonica reads back without decoding.
+    
+    Args:
+        page: The PDF page
+        dpi: Render resolution
+        
+    Returns:
+        Image.Image: The rendered page
+    """
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    # samples_mv is a view of the pixmap's own memory and does not keep the
+    # pixmap alive, so the image holds on to it
+    image = Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv, "raw", "L", pix.stride, 1)
+    image.info["pixmap"] = pix
+    image.format = "PPM"
+    return image
+
+
+def _image_pixels(image: Image.Image) -> Union[bytes, memoryview]:
+    """
+    Return an image's raw pixels, without a copy for rendered pages.
+    
+    Args:
+        image: The page image
+        
+    Returns:
+        Union[bytes, memoryview]: The pixel data
+    """
+    pix = image.info.get("pixmap")
+    return pix.samples_mv if pix is not None else image.tobytes()
+
+
+def _line_pitch(profile: List[float], min_lag: int, max_lag: int) -> Optional[int]:
+    """
+    Find the text line pitch from a page's row ink profile.
+    
+    Lines of text repeat at a fixed pitch, so the profile's autocorrelation
+    peaks at that lag. This holds even when lines are set so tightly that
+    no blank row separates them.
+    
+    Args:
+        profile: Ink density per pixel row
+        min_lag: Smallest pitch to consider, in pixels
+        max_lag: Largest pitch to consider, in pixels
+        
+    Returns:
+        Optional[int]: The pitch in pixels, or None if the page shows no regular lines
+    """
+    mean = sum(profile) / len(profile)
+    centered = [value - mean for value in profile]
+    energy = sum(value * value for value in centered)
+    if not energy:
+        return None
+    
+    max_lag = min(max_lag, len(centered) - 2)
+    correlation = {
+        lag: sum(map(operator.mul, centered, centered[lag:])) / energy
+        for lag in range(min_lag - 1, max_lag + 2)
+    }
+    peaks = [
+        lag for lag in range(min_lag, max_lag + 1)
+        if correlation[lag] > correlation[lag - 1] and correlation[lag] >= correlation[lag + 1]
+    ]
+    if not peaks:
+        return None
+    
+    # Multiples of the pitch peak too; take the first peak close to the best
+    best = max(correlation[lag] for lag in peaks)
+    if best < 0.2:
+        return None
+    return next(lag for lag in peaks if correlation[lag] >= 0.7 * best)
+
+
+def _estimate_text_size(page: fitz.Page) -> Optional[float]:
+    """
+    Estimate the body text font size of a scanned page, in points.
+    
+    The line pitch is found from the row ink profile. Within each pitch,
+    runs of ink rows are joined into one line (rejoining descenders split
+    off by a blank row), and a line's ink is about 0.8 of its font size.
+    The pitch caps the estimate, since the text cannot be larger than the
+    distance between its lines.
+    
+    Args:
+        page: The PDF page
+        
+    Returns:
+        Optional[float]: Font size in points, or None if no text lines were found
+    """
+    scale = SIZE_PREVIEW_SCALE
+    preview = _render_page_to_pil(page, dpi=72 * scale)
+    
+    # Ink density per row: threshold, then average each row down to one pixel
+    binary = preview.point(lambda value: 255 if value < 160 else 0)
+    profile = list(binary.resize((1, preview.height), Image.BOX).getdata())
+    
+    pitch = _line_pitch(profile, 3 * scale, 60 * scale)
+    if pitch is None:
+        return None
+    
+    lines = []
+    start = None
+    for row, value in enumerate(profile + [0]):
+        if value > 5 and start is None:
+            start = row
+        elif value <= 5 and start is not None:
+            # Part of the previous line if the two together fit in one pitch
+            if lines and row - lines[-1][0] < pitch:
+                lines[-1][1] = row
+            else:
+                lines.append([start, row])
+            start = None
+    
+    # Runs no taller than a couple of points are rules and specks
+    heights = [min(end - begin, pitch) for begin, end in lines if end - begin > scale]
+    if not heights:
+        return None
+    
+    return min(statistics.median(heights) / 0.8, pitch) / scale
+
+
+def _choose_ocr_dpi(page: fitz.Page) -> int:
+    """
+    Pick the OCR resolution for a page from its estimated text size.
+    
+    Args:
+        page: The PDF page
+        
+    Returns:
+        int: Resolution to render the page at for OCR
+    """
+    size = _estimate_text_size(page)
+    if size is None:
+        return OCR_DPI
+    if size >= LARGE_TEXT_MIN_PT:
+        return OCR_DPI_LARGE_TEXT
+    if size <= SMALL_TEXT_MAX_PT:
+        return OCR_DPI_SMALL_TEXT
+    return OCR_DPI
+
+
+def _render_page_for_ocr(page: fitz.Page, dpi: Optional[int] = None) -> Image.Image:
+    """
+    Render a page for OCR, at a resolution chosen for its text size unless given.
+    
+    Args:
+        page: The PDF page
+        dpi: Fixed render resolution, or None to choose one per page
+        
+    Returns:
+        Image.Image: The rendered page
+    """
+    return _render_page_to_pil(page, dpi or _choose_ocr_dpi(page))
+
+
+def _ocr_cache_key_for(image: Image.Image, lang: str, config: str) -> Optional[str]:
+    """
+    Build the OCR cache key for a page image.
+    
+    Args:
+        image: The page image
+        lang: OCR language(s)
+        config: Extra Tesseract options
+        
+    Returns:
+        Optional[str]: The key, or None if the OCR cache is disabled
+    """
+    if not ocr_cache_enabled():
+        return None
+    return ocr_cache_key(_image_pixels(image), image.mode, f"{image.width}x{image.height}", lang, config)
+
+
+def _run_tesseract(image: Image.Image, lang: str, config: str) -> Optional[str]:
+    """
+    Run Tesseract on one page image, logging instead of raising on failure.
+    
+    Args:
+        image: The page image
+        lang: OCR language(s)
+        config: Extra Tesseract options
+        
+    Returns:
+        Optional[str]: Recognized text, or None if Tesseract failed
+    """
+    try:
+        return pytesseract.image_to_string(image, lang=lang, config=config)
+    except Exception:
+        logger.exception("OCR failed for a page image")
+        return None
+
+
+def _ocr_image(
+    image: Image.Image,
+    lang: str,
+    config: str = OCR_CONFIG,
+    source: Optional[str] = None
+) -> Optional[str]:
+    """
+    OCR one page image, logging instead of raising on failure.
+    
+    Results are cached on disk by image content, so re-processing a file
+    (or a page identical to one seen before) skips Tesseract.
+    
+    Args:
+        image: The page image
+        lang: OCR language(s)
+        config: Extra Tesseract options
+        source: Path of the PDF the page is from, so its cached text can be deleted with it
+        
+    Returns:
+        Optional[str]: Recognized text, or None if Tesseract failed
+    """
+    key = _ocr_cache_key_for(image, lang, config)
+    if key is not None:
+        cached = get_cached_text(key)
+        if cached is not None:
+            if source:
+                remember_document_keys(source, [key])
+            return cached
+    
+    text = _run_tesseract(image, lang, config)
+    
+    if key is not None and text is not None:
+        store_text(key, text)
+        if source:
+            remember_document_keys(source, [key])
+    
+    return text
+
+
+def _ocr_batch(images: List[Image.Image], lang: str, config: str) -> List[Optional[str]]:
+    """
+    OCR several page images with a single Tesseract run.
+    
+    The pages are written to one uncompressed multi-page TIFF, so Tesseract
+    starts and loads its models once for the batch; its output has a form
+    feed after every page. If the run fails or the page count doesn't
+    match, the pages are OCR'd one by one instead.
+    
+    Args:
+        images: The page images
+        lang: OCR language(s)
+        config: Extra Tesseract options
+        
+    Returns:
+        List[Optional[str]]: Text per page, None where OCR failed
+    """
+    if len(images) == 1:
+        return [_run_tesseract(images[0], lang, config)]
+    
+    fd, tiff_path = tempfile.mkstemp(prefix="ocr_", suffix=".tif")
+    os.close(fd)
+    
+    try:
+        images[0].save(tiff_path, format="TIFF", save_all=True, append_images=images[1:])
+        text = pytesseract.image_to_string(tiff_path, lang=lang, config=config)
+    except Exception:
+        logger.exception("Batched OCR of %d pages failed, retrying page by page", len(images))
+        text = None
+    finally:
+        os.remove(tiff_path)
+    
+    if text is not None:
+        pages = text.split("\f")
+        if len(pages) == len(images) + 1 and not pages[-1].strip():
+            pages.pop()
+        if len(pages) == len(images):
+            return pages
+        logger.warning("Batched OCR returned %d pages for %d images, retrying page by page", len(pages), len(images))
+    
+    return [_run_tesseract(image, lang, config) for image in images]
+
+
+def _ocr_images(
+    images: Iterable[Image.Image],
+    count: int,
+    lang: str = OCR_LANG,
+    config: str = OCR_CONFIG,
+    source: Optional[str] = None
+) -> List[Optional[str]]:
+    """
+    OCR page images in parallel, keeping page order.
+    
+    The caller's thread produces images (rendering pages as the generator
+    is advanced) while the pool OCRs earlier ones. Pages found in the OCR
+    cache are skipped; the rest are grouped into batches of up to
+    OCR_BATCH_PAGES, one Tesseract run each, with batches made smaller for
+    short documents so every worker gets one. pytesseract runs Tesseract
+    as a subprocess, so threads are enough to keep several batches in
+    flight. At most two batches per worker are rendered but not yet OCR'd;
+    rendering waits for any batch to finish, not the oldest, so a slow
+    batch doesn't stall the pipeline. This bounds memory regardless of
+    document length.
+    
+    Args:
+        images: Page images, in page order
+        count: Number of images
+        lang: OCR language(s)
+        config: Extra Tesseract options
+        source: Path of the PDF the pages are from, so its cached text can be deleted with it
+        
+    Returns:
+        List[Optional[str]]: Text per page, None where OCR failed
+    """
+    workers = max(1, min(OCR_WORKERS, count))
+    batch_size = max(1, min(OCR_BATCH_PAGES, -(-count // workers)))
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    results: List[Optional[str]] = []
+    jobs = []
+    used_keys = []
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        
+        def submit(batch):
+            in_flight.acquire()
+            future = pool.submit(_ocr_batch, [image for _, _, image in batch], lang, config)
+            future.add_done_callback(lambda _: in_flight.release())
+            jobs.append(([(index, key) for index, key, _ in batch], future))
+        
+        batch = []
+        for index, image in enumerate(images):
+            key = _ocr_cache_key_for(image, lang, config)
+            cached = get_cached_text(key) if key is not None else None
+            results.append(cached)
+            if cached is not None:
+                used_keys.append(key)
+                continue
+            
+            batch.append((index, key, image))
+            if len(batch) == batch_size:
+                submit(batch)
+                batch = []
+        if batch:
+            submit(batch)
+    
+    for pages, future in jobs:
+        for (index, key), text in zip(pages, future.result()):
+            results[index] = text
+            if key is not None and text is not None:
+                store_text(key, text)
+                used_keys.append(key)
+    
+    if source:
+        remember_document_keys(source, used_keys)
+    
+    return results
+
+
+def _ocr_pages_into(parts: List[str], doc: fitz.Document, numbers: List[int], source: str) -> None:
+    """
+    OCR some pages of a document into the per-page text list.
+    
+    A page whose OCR fails keeps the text it already has.
+    
+    Args:
+        parts: Text per page, updated in place
+        doc: The open PDF document
+        numbers: Page numbers to OCR, in order
+        source: Path of the PDF file, for the OCR cache
+    """
+    images = (_render_page_for_ocr(doc[number]) for number in numbers)
+    for number, text in zip(numbers, _ocr_images(images, len(numbers), source=source)):
+        if text is not None:
+            parts[number] = text
+
 
 def extract_text_from_pdf(file_path: str) -> str:
     """
     Extract text from a PDF file using multiple methods.
     
-    First tries PyMuPDF for embedded text, then falls back to OCR if needed.
+    Each page is routed on its own: born-digital pages are read from the
+    text layer with PyMuPDF, scanned pages are rendered and OCR'd. Mixed
+    documents therefore keep their scanned pages, and digital pages never
+    pay for OCR.
     
     Args:
         file_path: Path to the PDF file
@@ -21,81 +496,118 @@ def extract_text_from_pdf(file_path: str) -> str:
     Returns:
         str: Extracted text
     """
-    text = ""
+    parts = []
     
     try:
-        # Try PyMuPDF first (for PDFs with embedded text)
         with fitz.open(file_path) as doc:
+            scanned = []
             for page in doc:
-                page_text = page.get_text()
-                text += page_text + "\n"
-        
-        # If no text extracted, try OCR
-        if not text.strip():
-            text = extract_text_with_ocr(file_path)
+                # One TextPage serves both the text and the image check;
+                # recording image blocks costs next to nothing, whereas
+                # page.get_image_info() would lay the page out a second time
+                textpage = page.get_textpage(flags=TEXT_FLAGS | fitz.TEXT_PRESERVE_IMAGES)
+                page_text = page.get_text("text", textpage=textpage)
+                if not _page_is_digital(page, textpage, page_text):
+                    scanned.append(page.number)
+                parts.append(page_text)
+            
+            if scanned:
+                _ocr_pages_into(parts, doc, scanned, file_path)
+            
+            # Nothing readable at all (e.g. text drawn as vector outlines):
+            # OCR the pages that were read as digital too. The scanned ones
+            # were just OCR'd and aren't run through Tesseract again.
+            if not any(part.strip() for part in parts):
+                tried = set(scanned)
+                untried = [number for number in range(len(doc)) if number not in tried]
+                if untried:
+                    _ocr_pages_into(parts, doc, untried, file_path)
             
     except Exception as e:
-        print(f"Error extracting text with PyMuPDF: {e}")
+        logger.warning("Error extracting text with PyMuPDF from %s: %s", file_path, e)
         # Fallback to OCR
         try:
-            text = extract_text_with_ocr(file_path)
-        except Exception as ocr_error:
-            print(f"OCR also failed: {ocr_error}")
+            return extract_text_with_ocr(file_path)
+        except Exception:
+            logger.exception("OCR also failed for %s", file_path)
     
-    return text.strip()
+    return "\n".join(parts).strip()
 
 
-def extract_text_with_ocr(file_path: str, lang: str = "nor+eng") -> str:
+def extract_text_with_ocr(
+    file_path: str,
+    lang: str = "nor+eng",
+    dpi: Optional[int] = None,
+    config: str = OCR_CONFIG
+) -> str:
     """
     Extract text from PDF using OCR.
     
     Args:
         file_path: Path to the PDF file
         lang: OCR language(s), default Norwegian + English
+        dpi: Render resolution, or None to choose one per page from its text size
+        config: Extra Tesseract options
         
     Returns:
         str: Extracted text
     """
-    text = ""
+    texts = []
     
     try:
-        # Convert PDF to images
-        images = convert_from_path(file_path, dpi=200)
-        
-        # OCR each image
-        for image in images:
-            page_text = pytesseract.image_to_string(image, lang=lang)
-            text += page_text + "\n"
+        with fitz.open(file_path) as doc:
+            # Pages are rendered one at a time as the OCR workers need them
+            images = (_render_page_for_ocr(page, dpi) for page in doc)
+            texts = [text or "" for text in _ocr_images(images, len(doc), lang, config, file_path)]
             
-    except Exception as e:
-        print(f"Error during OCR: {e}")
+    except Exception:
+        logger.exception("Error during OCR of %s", file_path)
     
-    return text.strip()
+    return "\n".join(texts).strip()
 
 
-def get_pdf_info(file_path: str) -> Dict[str, Any]:
+def _page_probe_order(page_count: int) -> List[int]:
     """
-    Get information about a PDF file.
+    Order pages for a "has any text" check.
+    
+    The first, middle and last pages come first, since a digital PDF almost
+    always shows text on one of them; the rest follow in order.
+    
+    Args:
+        page_count: Number of pages in the document
+        
+    Returns:
+        List[int]: Every page index, probes first
+    """
+    probes = list(dict.fromkeys(i for i in (0, page_count // 2, page_count - 1) if 0 <= i < page_count))
+    return probes + [i for i in range(page_count) if i not in probes]
+
+
+@lru_cache(maxsize=128)
+def _read_pdf_info(file_path: str, mtime_ns: int, file_size: int) -> Dict[str, Any]:
+    """
+    Read PDF information in a single open of the file.
+    
+    Cached by path, modification time and size, so an unchanged file is
+    only parsed once.
     
     Args:
         file_path: Path to the PDF file
+        mtime_ns: Modification time of the file, part of the cache key
+        file_size: Size of the file in bytes, part of the cache key
         
     Returns:
         Dict[str, Any]: PDF information
     """
     info = {
         "page_count": 0,
-        "file_size": 0,
+        "file_size": file_size,
         "metadata": {},
         "is_encrypted": False,
         "has_text": False
     }
     
     try:
-        # Get file size
-        info["file_size"] = os.path.getsize(file_path)
-        
-        # Open PDF
         with fitz.open(file_path) as doc:
             info["page_count"] = len(doc)
             info["is_encrypted"] = doc.is_encrypted
@@ -113,38 +625,75 @@ def get_pdf_info(file_path: str) -> Dict[str, Any]:
                     "modification_date": metadata.get("modDate", ""),
                 }
             
-            # Check if PDF has embedded text
-            for page in doc:
-                if page.get_text().strip():
-                    info["has_text"] = True
-                    break
+            # Check if PDF has embedded text, stopping at the first page that does
+            info["has_text"] = any(
+                doc.get_page_text(number, flags=0).strip()
+                for number in _page_probe_order(len(doc))
+            )
                     
-    except Exception as e:
-        print(f"Error getting PDF info: {e}")
+    except Exception:
+        logger.exception("Error getting PDF info for %s", file_path)
     
     return info
 
 
-def extract_metadata(file_path: str) -> Dict[str, Optional[str]]:
+def get_pdf_info(file_path: str) -> Dict[str, Any]:
     """
-    Extract metadata from a PDF file.
+    Get information about a PDF file.
     
     Args:
         file_path: Path to the PDF file
         
+    Returns:
+        Dict[str, Any]: PDF information
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        logger.exception("Error getting PDF info for %s", file_path)
+        return {
+            "page_count": 0,
+            "file_size": 0,
+            "metadata": {},
+            "is_encrypted": False,
+            "has_text": False
+        }
+    
+    info = _read_pdf_info(file_path, stat.st_mtime_ns, stat.st_size)
+    
+    # Callers get their own copy; the cached dict must not be modified
+    return {**info, "metadata": dict(info["metadata"])}
+
+
+_METADATA_FIELDS = (
+    "title",
+    "author",
+    "subject",
+    "keywords",
+    "creator",
+    "producer",
+    "creation_date",
+    "modification_date",
+)
+
+
+@lru_cache(maxsize=256)
+def _read_metadata(file_path: str, mtime_ns: int, file_size: int) -> Dict[str, Optional[str]]:
+    """
+    Read a PDF's Info dictionary.
+    
+    Cached by path, modification time and size, so an unchanged file is
+    only opened once.
+    
+    Args:
+        file_path: Path to the PDF file
+        mtime_ns: Modification time of the file, part of the cache key
+        file_size: Size of the file in bytes, part of the cache key
+        
     Returns:
         Dict[str, Optional[str]]: PDF metadata
     """
-    metadata = {
-        "title": None,
-        "author": None,
-        "subject": None,
-        "keywords": None,
-        "creator": None,
-        "producer": None,
-        "creation_date": None,
-        "modification_date": None,
-    }
+    metadata = dict.fromkeys(_METADATA_FIELDS)
     
     try:
         with fitz.open(file_path) as doc:
@@ -159,12 +708,57 @@ def extract_metadata(file_path: str) -> Dict[str, Optional[str]]:
                 metadata["creation_date"] = pdf_metadata.get("creationDate") or None
                 metadata["modification_date"] = pdf_metadata.get("modDate") or None
                 
-    except Exception as e:
-        print(f"Error extracting metadata: {e}")
+    except Exception:
+        logger.exception("Error extracting metadata from %s", file_path)
     
     return metadata
 
 
+def extract_metadata(file_path: str) -> Dict[str, Optional[str]]:
+    """
+    Extract metadata from a PDF file.
+    
+    Args:
+        file_path: Path to the PDF file
+        
+    Returns:
+        Dict[str, Optional[str]]: PDF metadata
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        logger.exception("Error extracting metadata from %s", file_path)
+        return dict.fromkeys(_METADATA_FIELDS)
+    
+    # Callers get their own copy; the cached dict must not be modified
+    return dict(_read_metadata(file_path, stat.st_mtime_ns, stat.st_size))
+
+
+def _ocr_page_with_mupdf(page: fitz.Page, lang: str) -> Optional[str]:
+    """
+    OCR a page in-process with MuPDF's built-in Tesseract.
+    
+    Needs TESSDATA_PREFIX pointing at the Tesseract language data.
+    
+    Args:
+        page: The PDF page
+        lang: OCR language(s)
+        
+    Returns:
+        Optional[str]: Recognized text, or None if MuPDF OCR is unavailable or
+            failed, in which case the caller falls back to pytesseract
+    """
+    try:
+        textpage = page.get_textpage_ocr(language=lang, dpi=_choose_ocr_dpi(page), full=True)
+        return page.get_text(textpage=textpage)
+    except RuntimeError as e:
+        # Raised when MuPDF was built without Tesseract or finds no tessdata
+        logger.debug("MuPDF OCR unavailable, using pytesseract: %s", e)
+    except Exception:
+        logger.warning("MuPDF OCR failed on page %d, using pytesseract", page.number, exc_info=True)
+    return None
+
+
 def extract_text_from_page(file_path: str, page_number: int) -> str:
     """
     Extract text from a specific page of a PDF.
@@ -182,20 +776,41 @@ def extract_text_from_page(file_path: str, page_number: int) -> str:
         with fitz.open(file_path) as doc:
             if 0 <= page_number < len(doc):
                 page = doc[page_number]
-                text = page.get_text()
+                text = page.get_text("text", flags=TEXT_FLAGS)
                 
                 # If no text, try OCR on this page
                 if not text.strip():
-                    images = convert_from_path(file_path, first_page=page_number+1, last_page=page_number+1)
-                    if images:
-                        text = pytesseract.image_to_string(images[0], lang="nor+eng")
+                    text = _ocr_page_with_mupdf(page, "nor+eng")
+                    if text is None:
+                        text = _ocr_image(_render_page_for_ocr(page), "nor+eng", source=file_path) or ""
                         
-    except Exception as e:
-        print(f"Error extracting text from page {page_number}: {e}")
+    except Exception:
+        logger.exception("Error extracting text from page %d of %s", page_number, file_path)
     
     return text.strip()
 
 
+@lru_cache(maxsize=32)
+def _load_search_pages(file_path: str, mtime_ns: int, file_size: int) -> Tuple[Tuple[str, str], ...]:
+    """
+    Extract every page's text for searching, with its lowered form.
+    
+    Cached by path, modification time and size, so repeated searches in an
+    unchanged file skip parsing and text extraction.
+    
+    Args:
+        file_path: Path to the PDF file
+        mtime_ns: Modification time of the file, part of the cache key
+        file_size: Size of the file in bytes, part of the cache key
+        
+    Returns:
+        Tuple[Tuple[str, str], ...]: (text, lowered text) per page
+    """
+    with fitz.open(file_path) as doc:
+        texts = [page.get_text("text", flags=TEXT_FLAGS) for page in doc]
+    return tuple((text, text.lower()) for text in texts)
+
+
 def search_in_pdf(file_path: str, query: str) -> list:
     """
     Search for text in a PDF file.
@@ -208,24 +823,27 @@ def search_in_pdf(file_path: str, query: str) -> list:
         list: List of search results with page numbers
     """
     results = []
+    needle = query.lower()
     
     try:
-        with fitz.open(file_path) as doc:
-            for page_num, page in enumerate(doc):
-                text = page.get_text()
-                if query.lower() in text.lower():
-                    # Find context around the match
-                    idx = text.lower().find(query.lower())
-                    start = max(0, idx - 50)
-                    end = min(len(text), idx + len(query) + 50)
-                    context = text[start:end]
-                    
-                    results.append({
-                        "page": page_num + 1,
-                        "context": f"...{context}..."
-                    })
-                    
-    except Exception as e:
-        print(f"Error searching in PDF: {e}")
+        stat = os.stat(file_path)
+        pages = _load_search_pages(file_path, stat.st_mtime_ns, stat.st_size)
+        
+        for page_num, (text, lowered) in enumerate(pages):
+            # The match position doubles as the membership test
+            idx = lowered.find(needle)
+            if idx != -1:
+                # Find context around the match
+                start = max(0, idx - 50)
+                end = min(len(text), idx + len(query) + 50)
+                context = text[start:end]
+                
+                results.append({
+                    "page": page_num + 1,
+                    "context": f"...{context}..."
+                })
+                
+    except Exception:
+        logger.exception("Error searching in %s", file_path)
     
     return results
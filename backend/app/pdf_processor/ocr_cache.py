@@ -0,0 +1,229 @@
+"""
+Disk cache for OCR results, keyed by the rendered page image.
+
+Each document's entries are listed in a manifest under documents/, so
+the cached text can be deleted together with the document.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import Iterable, Optional, Union
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX = ".txt"
+_MANIFEST_DIR = "documents"
+
+# Scanning the directory costs time proportional to the number of entries,
+# so it is only rescanned once this process has written this fraction of
+# the size limit since its last scan
+_PRUNE_EVERY = 0.05
+
+_prune_lock = threading.Lock()
+_written_since_prune: Optional[int] = None  # None until the first prune in this process
+
+
+def ocr_cache_enabled() -> bool:
+    """Return True if OCR results should be cached on disk."""
+    return bool(settings.OCR_CACHE_DIR) and settings.OCR_CACHE_MAX_MB > 0
+
+
+def ocr_cache_key(pixels: Union[bytes, memoryview], *params: str) -> str:
+    """
+    Build a cache key from page pixels and the OCR parameters.
+    
+    Args:
+        pixels: Raw pixel data of the rendered page
+        *params: Anything else that changes the OCR output (mode, size, language)
+        
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256(pixels)
+    for param in params:
+        digest.update(b"\0")
+        digest.update(param.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_cached_text(key: str) -> Optional[str]:
+    """
+    Look up a cached OCR result.
+    
+    Args:
+        key: Key from ocr_cache_key
+        
+    Returns:
+        Optional[str]: The cached text, or None on a miss
+    """
+    path = os.path.join(settings.OCR_CACHE_DIR, key + _SUFFIX)
+    
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return None
+    
+    # Entries are evicted oldest-mtime first, so touch the ones still in use
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    
+    return text
+
+
+def store_text(key: str, text: str) -> None:
+    """
+    Cache an OCR result, evicting old entries if the cache is over its size limit.
+    
+    The entry is written to a temporary file and moved into place, so
+    concurrent readers never see a partial file. The size limit is checked
+    on the first write and then after every few MB written, so the cache
+    may briefly overshoot it by that much per process.
+    
+    Args:
+        key: Key from ocr_cache_key
+        text: The recognized text
+    """
+    directory = settings.OCR_CACHE_DIR
+    tmp_path = None
+    
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            size = f.tell()
+        os.replace(tmp_path, os.path.join(directory, key + _SUFFIX))
+    except OSError:
+        logger.warning("Could not write OCR cache entry %s", key, exc_info=True)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    
+    if _prune_due(size):
+        _prune(directory)
+
+
+def _manifest_path(source: str) -> str:
+    """Return the path of the manifest listing a document's cache entries."""
+    name = hashlib.sha256(os.path.basename(source).encode("utf-8")).hexdigest()
+    return os.path.join(settings.OCR_CACHE_DIR, _MANIFEST_DIR, name + ".keys")
+
+
+def remember_document_keys(source: str, keys: Iterable[str]) -> None:
+    """
+    Record that cache entries hold text from a document.
+    
+    Args:
+        source: Path of the stored PDF file
+        keys: Keys of the entries used for its pages
+    """
+    keys = list(keys)
+    if not keys or not ocr_cache_enabled():
+        return
+    
+    path = _manifest_path(source)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="ascii") as f:
+            f.write("".join(key + "\n" for key in keys))
+    except OSError:
+        logger.warning("Could not record OCR cache entries for %s", source, exc_info=True)
+
+
+def forget_document(source: str) -> None:
+    """
+    Delete the cached OCR text of a document.
+    
+    Entries shared with an identical page of another document are deleted
+    too; that document just misses the cache if it is processed again.
+    
+    Args:
+        source: Path of the stored PDF file
+    """
+    if not settings.OCR_CACHE_DIR:
+        return
+    
+    path = _manifest_path(source)
+    try:
+        with open(path, encoding="ascii") as f:
+            keys = f.read().split()
+        for key in keys:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(settings.OCR_CACHE_DIR, key + _SUFFIX))
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("Could not delete OCR cache entries for %s", source, exc_info=True)
+
+
+def _prune_due(size: int) -> bool:
+    """
+    Count a write towards the next prune and report whether it is due.
+    
+    Args:
+        size: Bytes just written
+        
+    Returns:
+        bool: True if the cache directory should be scanned now
+    """
+    global _written_since_prune
+    
+    with _prune_lock:
+        if _written_since_prune is not None:
+            _written_since_prune += size
+            if _written_since_prune < settings.OCR_CACHE_MAX_MB * 1024 * 1024 * _PRUNE_EVERY:
+                return False
+        _written_since_prune = 0
+        return True
+
+
+def _prune(directory: str) -> None:
+    """
+    Delete the least recently used entries once the cache exceeds its limit.
+    
+    Args:
+        directory: The cache directory
+    """
+    limit = settings.OCR_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    total = 0
+    
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.name.endswith(_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    except OSError:
+        # A cache that can't be read is skipped, never an extraction failure
+        logger.warning("Could not scan OCR cache directory %s", directory, exc_info=True)
+        return
+    
+    if total <= limit:
+        return
+    
+    # Trim to 90% so the next few writes don't each trigger a prune
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= limit * 0.9:
+            break
@@ -0,0 +1,84 @@
+"""
+Process pool for CPU-bound PDF work.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from app.config import settings
+from app.logging_config import configure_worker_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _new_executor() -> ProcessPoolExecutor:
+    """Create the pool. Workers are started on first use."""
+    # "spawn" keeps children from inheriting the server's threads, locks
+    # and database connections
+    return ProcessPoolExecutor(
+        max_workers=settings.PDF_WORKERS or None,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=configure_worker_logging,
+    )
+
+
+_executor = _new_executor()
+_executor_lock = threading.Lock()
+
+
+def _replace_broken_executor(broken: ProcessPoolExecutor) -> None:
+    """
+    Swap in a new pool after a worker died.
+
+    A pool whose worker exits abruptly (crash, OOM kill) fails every later
+    submit. Only the first caller to notice replaces it; the others find
+    a fresh pool already in place.
+
+    Args:
+        broken: The pool that raised BrokenProcessPool
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is broken:
+            _executor = _new_executor()
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_pdf_pool(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a picklable function in the PDF process pool.
+
+    If a worker process dies, the pool is replaced and the call retried
+    once; a second failure is raised to the caller.
+
+    Args:
+        func: Module-level function to call
+        *args: Positional arguments for func
+
+    Returns:
+        Any: The function's return value
+    """
+    loop = asyncio.get_running_loop()
+
+    for attempt in range(2):
+        executor = _executor
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            logger.warning("PDF worker process died, restarting the pool", exc_info=True)
+            _replace_broken_executor(executor)
+            if attempt:
+                raise
+
+
+def shutdown_pdf_pool() -> None:
+    """Stop the pool's worker processes, cancelling queued work."""
+    with _executor_lock:
+        executor = _executor
+    executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,11 @@
+"""
+Test configuration: make the `app` package importable from the tests.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Tests never write OCR results to the shared cache
+os.environ.setdefault("OCR_CACHE_DIR", "")
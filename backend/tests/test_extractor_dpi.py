@@ -0,0 +1,58 @@
+"""
+Tests for picking the OCR resolution of scanned pages.
+"""
+
+import fitz
+import pytest
+
+from app.pdf_processor.extractor import (
+    OCR_DPI,
+    OCR_DPI_LARGE_TEXT,
+    OCR_DPI_SMALL_TEXT,
+    _choose_ocr_dpi,
+)
+
+FONTS = ("helv", "tiro", "cour")
+LINE_SPACINGS = (1.0, 1.15, 1.5)
+LINE_TEXT = "Pasienten ble innlagt med smerter i brystet og fikk behandling"
+
+
+def _scanned_page(doc: fitz.Document, font: str, size: float, spacing: float) -> fitz.Page:
+    """Add a page holding only an image of lines of text, like a scan."""
+    source = fitz.open()
+    text_page = source.new_page()
+    y = 72
+    while y < 770:
+        text_page.insert_text((50, y), LINE_TEXT, fontsize=size, fontname=font)
+        y += size * spacing
+    png = text_page.get_pixmap(dpi=150).tobytes("png")
+    source.close()
+    
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=png)
+    return page
+
+
+@pytest.mark.parametrize("spacing", LINE_SPACINGS)
+@pytest.mark.parametrize("font", FONTS)
+def test_dpi_across_font_sizes_and_spacings(font, spacing):
+    doc = fitz.open()
+    chosen = {size: _choose_ocr_dpi(_scanned_page(doc, font, size, spacing))
+              for size in (6, 7, 8, 10, 11, 12, 14, 16, 20, 24)}
+    
+    # Small print always gets the highest resolution, however tight the lines
+    for size in (6, 7, 8):
+        assert chosen[size] == OCR_DPI_SMALL_TEXT, (size, chosen)
+    # Body text is never rendered at the low resolution
+    for size in (10, 11, 12):
+        assert chosen[size] in (OCR_DPI, OCR_DPI_SMALL_TEXT), (size, chosen)
+    # Headings and large print never get the highest resolution
+    for size in (14, 16):
+        assert chosen[size] in (OCR_DPI, OCR_DPI_LARGE_TEXT), (size, chosen)
+    for size in (20, 24):
+        assert chosen[size] == OCR_DPI_LARGE_TEXT, (size, chosen)
+
+
+def test_blank_page_uses_default_dpi():
+    doc = fitz.open()
+    assert _choose_ocr_dpi(doc.new_page()) == OCR_DPI
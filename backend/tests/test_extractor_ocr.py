@@ -0,0 +1,54 @@
+"""
+Tests for parallel OCR of page images.
+"""
+
+import os
+import threading
+import time
+
+from PIL import Image
+
+from app.config import settings
+from app.pdf_processor import extractor
+
+
+def test_default_ocr_workers_use_every_cpu():
+    assert settings.PDF_WORKERS == 0
+    assert extractor.OCR_WORKERS == (os.cpu_count() or 1)
+
+
+def test_explicit_pdf_workers_split_the_cpus():
+    assert extractor._ocr_worker_count(8, 0) == 8
+    assert extractor._ocr_worker_count(8, 2) == 4
+    assert extractor._ocr_worker_count(8, 3) == 2
+    assert extractor._ocr_worker_count(2, 4) == 1
+
+
+def test_pages_are_ocrd_concurrently(monkeypatch):
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+    
+    def fake_batch(images, lang, config):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return [f"page {image.info['n']}" for image in images]
+    
+    monkeypatch.setattr(extractor, "OCR_WORKERS", 3)
+    monkeypatch.setattr(extractor, "_ocr_batch", fake_batch)
+    
+    images = []
+    for n in range(6):
+        image = Image.new("L", (8, 8), 255)
+        image.info["n"] = n
+        images.append(image)
+    
+    texts = extractor._ocr_images(iter(images), len(images))
+    
+    assert texts == [f"page {n}" for n in range(6)]
+    assert peak == 3